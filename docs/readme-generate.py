@@ -20,11 +20,11 @@ def get_template():
     with open(str(SNUTREE_ROOT/'docs/readme-template.rst'), 'r') as f:
         return f.read()
 
-def generate_readme(template):
+def get_usage(*subcommand):
 
     # Get usage information
     result = subprocess.run(
-        [str(SNUTREE_ROOT/'snutree.py'), '--help'],
+        [str(SNUTREE_ROOT/'snutree.py'), *subcommand, '--help'],
         stdout=subprocess.PIPE,
         universal_newlines=True, # Python 3.5
         # encoding='utf-8', # Python 3.6
@@ -32,10 +32,14 @@ def generate_readme(template):
     return_code = result.returncode
     if return_code:
         sys.exit(return_code)
-    usage = result.stdout
+    return result.stdout
+
+def generate_readme(template):
 
     return template.format(
-        CLI_HELP=indent(usage, ' '*4),
+        CLI_HELP=indent(get_usage(), ' '*4),
+        CLI_HELP_BATCH=indent(get_usage('batch'), ' '*4),
+        CLI_HELP_SERVE=indent(get_usage('serve'), ' '*4),
         CONFIG_API=describe_schema(api.CONFIG_SCHEMA, level=2),
         CONFIG_READER_CSV=describe_schema(reader_csv.CONFIG_SCHEMA, level=2),
         CONFIG_READER_SQL=describe_schema(reader_sql.CONFIG_SCHEMA, level=2),
@@ -1,7 +1,36 @@
-from pkg_resources import get_distribution, DistributionNotFound
+import sys
+from functools import lru_cache
+from types import ModuleType
 
-try:
-    version = get_distribution(__name__).version
-except DistributionNotFound:
-    version = 'unknown'
+@lru_cache(maxsize=None)
+def get_version():
+    '''
+    Returns the installed version of snutree. (Importing pkg_resources takes
+    longer than the rest of the command-line interface combined, so it is only
+    done when the version is actually needed, and only if the faster
+    importlib.metadata of Python 3.8+ is unavailable.)
+    '''
 
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        from pkg_resources import get_distribution, DistributionNotFound as PackageNotFoundError
+        version = lambda name: get_distribution(name).version
+
+    try:
+        return version(__name__)
+    except PackageNotFoundError:
+        return 'unknown'
+
+class Snutree(ModuleType):
+    '''
+    The snutree package module, whose `version` attribute is only looked up
+    when it is first used (see get_version). (Python 3.7+ could use a
+    module-level __getattr__ instead.)
+    '''
+
+    @property
+    def version(self):
+        return get_version()
+
+sys.modules[__name__].__class__ = Snutree
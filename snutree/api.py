@@ -1,16 +1,26 @@
+import json
 import logging
+import os
+import queue
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from itertools import chain
 from contextlib import contextmanager
+from functools import lru_cache
 from typing import Any, List, IO
 from pathlib import Path
 from collections import MutableSequence, MutableMapping
-import yaml
+from threading import Event, Thread
 from cerberus import Validator
 from pluginbase import PluginBase
+from .cache import BuildCache, fingerprint
 from .errors import SnutreeError
 from .tree import FamilyTree
 from .utilities.logging import logged
 from .utilities.cerberus import Validator
+from .utilities.filecache import atomic_writer
+from .utilities.plugins import SNUTREE_ROOT, get_builtin_plugins
 
 ###############################################################################
 ###############################################################################
@@ -26,30 +36,18 @@ def generate(input_files: List[IO[Any]],
              writer: str,
              output_format: str,
              seed: int,
+             cache_path: Path = None,
             ):
     '''
-    Create a big-little family tree.
+    Create a big-little family tree. If a cache_path is provided, state is
+    kept in that directory between runs, so that later runs only validate
+    rows that were inserted or changed since the previous run (and reuse the
+    previous output entirely if nothing changed).
     '''
 
     logger = logging.getLogger(__name__)
 
-    # Parameters for this function that can also be included in config files
-    config_args = denullified({
-        'readers' : {
-            'stdin' : {
-                'filetype' : input_format,
-                },
-            },
-        'schema' : {
-            'name' : schema,
-            },
-        'writer' : {
-            'filetype' : output_format,
-            'file' : output_path,
-            'name' : writer,
-            },
-        'seed' : seed,
-        })
+    config_args = get_config_args(output_path, input_format, schema, writer, output_format, seed)
 
     logger.info('Loading configuration files')
     config = get_config(config_files, config_args)
@@ -60,8 +58,54 @@ def generate(input_files: List[IO[Any]],
     logger.info('Reading member table from data sources')
     member_table = get_member_table(input_files, config['readers'])
 
+    create_output(config, schema, member_table, cache_path)
+
+def create_output(config, schema, member_table, cache_path=None):
+    '''
+    Validate the member table with the schema module, build the tree, and
+    write it to the output file, all according to the (validated) config.
+    '''
+
+    logger = logging.getLogger(__name__)
+
+    if cache_path is not None:
+        logger.info('Loading build cache')
+        writer_name, writer = find_writer_module(config['writer']['filetype'], config['writer']['name'])
+        cache = BuildCache(cache_path, schema, writer, config, keep_rows=(writer_name == 'table'))
+        member_table = cache.read(member_table)
+        if cache.output is not None:
+            logger.info('Inputs and configuration unchanged; reusing previous output')
+            write_output(cache.output, path=config['writer']['file'])
+            logger.info('Done')
+            return
+        to_Members = cache.to_Members
+    else:
+        cache = None
+        to_Members = schema.to_Members
+
+    output = compile_output(config, schema, member_table, to_Members)
+
+    if cache is not None:
+        logger.info('Saving build cache')
+        output = output if isinstance(output, bytes) else b''.join(output)
+        cache.save(output)
+
+    logger.info('Writing to file')
+    write_output(output, path=config['writer']['file'])
+
+    logger.info('Done')
+
+def compile_output(config, schema, member_table, to_Members=None):
+    '''
+    Validate the member table with the schema module (or the to_Members
+    function, if provided), build the tree, and return the writer's output,
+    all according to the (validated) config.
+    '''
+
+    logger = logging.getLogger(__name__)
+
     logger.info('Validating member table')
-    members = schema.to_Members(member_table, **config['schema'])
+    members = (to_Members or schema.to_Members)(member_table, **config['schema'])
 
     logger.info('Loading writer module')
     writer_name, writer = find_writer_module(config['writer']['filetype'], config['writer']['name'])
@@ -81,11 +125,180 @@ def generate(input_files: List[IO[Any]],
         logger.warning('Bypassing tree generation and using raw table')
         output = writer.compile_table(member_table)
 
-    logger.info('Writing to file')
-    write_output(output, path=config['writer']['file'])
+    return output
+
+def render(member_table, config=None, schema=None, writer=None, output_format=None, seed=None) -> bytes:
+    '''
+    Create a big-little family tree from the member table (an iterable of
+    member dictionaries) and the configuration dictionary, and return the
+    output instead of writing it to a file. The other parameters are the same
+    as in generate.
+    '''
+    config_args = get_config_args(None, None, schema, writer, output_format, seed)
+    config = combine_configs([deepcopy(config or {})], config_args)
+    output = compile_output(config, get_schema_module(config['schema']['name']), member_table)
+    return output if isinstance(output, bytes) else b''.join(output)
+
+###############################################################################
+###############################################################################
+#### Batch Mode                                                            ####
+###############################################################################
+###############################################################################
+
+def generate_batch(manifest_file: IO[Any], workers: int = None):
+    '''
+    Create one big-little family tree for each job in the YAML manifest file
+    (see BATCH_SCHEMA). Jobs run on a pool of worker processes, one per CPU
+    unless the number of workers is given. Modules, configuration files, and
+    input tables are loaded at most once in each worker and shared by all the
+    jobs it runs. Every job is run even if others fail, and the failures are
+    reported together at the end.
+    '''
+
+    logger = logging.getLogger(__name__)
+
+    logger.info('Loading batch manifest')
+    jobs = get_batch_jobs(manifest_file)
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    logger.info('Running {n} jobs with {workers} workers'.format(n=len(jobs), workers=max(workers, 1)))
+    if workers <= 1:
+        errors = list(map(run_batch_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            errors = list(executor.map(run_batch_job, jobs))
+
+    failures = ['job {i} ({output}): {error}'.format(i=i, output=str(job['output']), error=error)
+                for i, (job, error) in enumerate(zip(jobs, errors), start=1) if error is not None]
+    if failures:
+        msg = '{n} of {total} batch jobs failed:\n{failures}'.format(n=len(failures), total=len(jobs), failures='\n'.join(failures))
+        raise SnutreeError(msg)
 
     logger.info('Done')
 
+def get_batch_jobs(manifest_file):
+    '''
+    Loads and validates the batch manifest file. Returns a list of jobs, each
+    a dictionary with the defaults filled in and every path resolved relative
+    to the directory containing the manifest.
+    '''
+
+    manifest, = load_config_files([manifest_file])
+    manifest = BATCH_VALIDATOR.validated(manifest)
+
+    name = getattr(manifest_file, 'name', '<stdin>')
+    directory = Path(name).parent if name != '<stdin>' else Path()
+    resolve = lambda path: directory/path if path is not None else None
+
+    # Schemas and writers are either built-in module names or custom module paths
+    resolve_module = lambda name: str(resolve(name)) if name is not None and name.endswith('.py') else name
+
+    jobs = []
+    for i, job in enumerate(manifest['jobs'], start=1):
+
+        job = dict(manifest['defaults'], **job)
+        for key in ('input', 'output'):
+            if not job.get(key):
+                msg = 'batch job {i} is missing {key!r}'.format(i=i, key=key)
+                raise SnutreeError(msg)
+
+        job['input'] = [resolve(path) for path in job['input']]
+        job['config'] = [resolve(path) for path in job.get('config', [])]
+        job['output'] = resolve(job['output'])
+        job['cache'] = resolve(job.get('cache'))
+        job['schema'] = resolve_module(job.get('schema'))
+        job['writer'] = resolve_module(job.get('writer'))
+        jobs.append(job)
+
+    return jobs
+
+def run_batch_job(job):
+    '''
+    Run a single job from a batch manifest. Returns None on success, or the
+    error message if the job failed with an expected error or could not read
+    or write a file. (Messages are returned instead of errors, because not
+    every error can be pickled to be sent back from a worker process.)
+    '''
+
+    logger = logging.getLogger(__name__)
+    logger.info('Running batch job for {output}'.format(output=str(job['output'])))
+
+    try:
+        config_args = get_config_args(job['output'], None, job.get('schema'), job.get('writer'), job.get('to'), job.get('seed'))
+        configs = [deepcopy(load_config_path(path)) for path in job['config']]
+        config = combine_configs(configs, config_args)
+        schema = get_schema_module(config['schema']['name'])
+        member_table = get_shared_member_table(job['input'], config['readers'])
+        create_output(config, schema, member_table, job['cache'])
+    except (SnutreeError, OSError) as e:
+        return str(e)
+
+    return None
+
+@lru_cache(maxsize=None)
+def load_config_path(path):
+    '''
+    Load the YAML configuration file at the path. Files are only loaded once
+    per process, so the result must be copied before being modified.
+    '''
+    try:
+        with Path(path).open('r', encoding='utf-8') as f:
+            config, = load_config_files([f])
+    except OSError as e:
+        msg = 'could not open configuration file {path!r}:\n{e}'.format(path=str(path), e=e)
+        raise SnutreeError(msg)
+    return config
+
+# Input tables that have already been read in this process, keyed by the path
+# and reader configuration they were read with
+SHARED_TABLES = {}
+
+def get_shared_member_table(paths, reader_configs):
+    '''
+    Like get_member_table, but reads from paths instead of open files, and
+    keeps each table in memory so that later jobs using the same input file
+    (e.g., a single national export) do not read it again. Yields copies of
+    the rows, so that the shared tables themselves are never modified.
+    '''
+
+    # Start reading every table not read before at once, but store them in
+    # the original order
+    keys = []
+    for path in paths:
+        filetype = path.suffix[1:]
+        reader_config = reader_configs.get(filetype, {})
+        key = (str(path.resolve()), fingerprint(reader_config))
+        if key not in SHARED_TABLES and key not in keys:
+            SHARED_TABLES[key] = read_ahead(read_path(path, filetype, reader_config))
+        keys.append(key)
+
+    tables = []
+    for key in keys:
+        table = SHARED_TABLES[key]
+        if not isinstance(table, list):
+            try:
+                table = list(table)
+            except BaseException:
+                del SHARED_TABLES[key]
+                raise
+            SHARED_TABLES[key] = table
+        tables.append(table)
+
+    return (dict(row) for table in tables for row in table)
+
+def read_path(path, filetype, reader_config):
+    '''
+    Yields the rows of the input file at the path, using the reader for the
+    filetype.
+    '''
+    reader = get_reader_module(filetype)
+    try:
+        with path.open('rb') as f:
+            yield from reader.get_table(f, **reader_config)
+    except OSError as e:
+        msg = 'could not read input file {path!r}:\n{e}'.format(path=str(path), e=e)
+        raise SnutreeError(msg)
+
 ###############################################################################
 ###############################################################################
 #### Configuration Schema                                                  ####
@@ -169,17 +382,74 @@ CONFIG_SCHEMA = {
 
 CONFIG_VALIDATOR = Validator(CONFIG_SCHEMA)
 
+# Options of each job in a batch manifest (see generate_batch). These mirror
+# the command-line options of the same names.
+JOB_SCHEMA = {
+    'input' : {
+        'description' : 'input file paths',
+        'type' : 'list',
+        'schema' : {'type' : 'string'},
+        },
+    'output' : {
+        'description' : 'output file path',
+        'type' : 'string',
+        },
+    'config' : {
+        'description' : 'configuration file paths; files listed earlier override later ones',
+        'type' : 'list',
+        'schema' : {'type' : 'string'},
+        },
+    'to' : {
+        'description' : 'filetype of the output file',
+        'type' : 'string',
+        },
+    'schema' : {
+        'description' : 'member table schema',
+        'type' : 'string',
+        },
+    'writer' : {
+        'description' : 'writer module',
+        'type' : 'string',
+        },
+    'seed' : {
+        'description' : 'random number generator seed',
+        'type' : 'integer',
+        },
+    'cache' : {
+        'description' : 'directory to keep incremental build state in',
+        'type' : 'string',
+        },
+    }
+
+BATCH_SCHEMA = {
+
+    'defaults' : {
+        'description' : 'options used by every job, unless the job sets them itself',
+        'type' : 'dict',
+        'schema' : JOB_SCHEMA,
+        'default' : {},
+        },
+
+    'jobs' : {
+        'description' : 'the trees to create',
+        'type' : 'list',
+        'required' : True,
+        'schema' : {
+            'type' : 'dict',
+            'schema' : JOB_SCHEMA,
+            },
+        },
+
+    }
+
+BATCH_VALIDATOR = Validator(BATCH_SCHEMA)
+
 ###############################################################################
 ###############################################################################
 #### Plugins Setup                                                         ####
 ###############################################################################
 ###############################################################################
 
-# The folder this file is located in (used for importing member formats)
-SNUTREE_ROOT = Path(__file__).parent \
-    if not getattr(sys, 'frozen', False) \
-    else Path(sys._MEIPASS) # pylint: disable=no-member,protected-access
-
 def get_plugin_base(subpackage):
     '''
     Returns the plugin base of the subpackage whose name is a parameter.
@@ -192,16 +462,77 @@ def get_plugin_builtins(plugin_base):
     '''
     Takes the plugin base and returns all modules in that plugin base.
     '''
-    return plugin_base.make_plugin_source(searchpath=[]).list_plugins()
+    return get_builtin_plugins(plugin_base.package.rsplit('.', 1)[-1])
 
 # Plugin bases for each of the possible types of plugins
 PLUGIN_BASES = tuple(get_plugin_base(p) for p in ('readers', 'schemas', 'writers'))
 READERS_PLUGIN_BASE, SCHEMAS_PLUGIN_BASE, WRITERS_PLUGIN_BASE = PLUGIN_BASES
 
 # Lists of the built-in plugins for each of the possible types of plugins
-BUILTIN_LISTS = tuple(get_plugin_builtins(p) for p in PLUGIN_BASES)
+BUILTIN_LISTS = tuple(get_builtin_plugins(p) for p in ('readers', 'schemas', 'writers'))
 BUILTIN_READERS, BUILTIN_SCHEMAS, BUILTIN_WRITERS = BUILTIN_LISTS
 
+# Where the registry of built-in plugins is saved between runs
+REGISTRY_PATH = Path(os.environ.get('XDG_CACHE_HOME') or str(Path.home()/'.cache'))/'snutree'/'plugins.json'
+
+# Increment whenever the format of the saved registry changes
+REGISTRY_VERSION = 1
+
+def get_plugin_signature(subpackage, name):
+    '''
+    Returns the modification time and size of the file of the built-in plugin
+    in the subpackage, or None if there is no such file (e.g., when frozen).
+    '''
+    try:
+        stat = (SNUTREE_ROOT/subpackage/'{name}.py'.format(name=name)).stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+@lru_cache(maxsize=None)
+def get_writer_registry():
+    '''
+    Returns a dictionary mapping the name of each built-in writer to a sorted
+    list of the filetypes it supports. Finding those filetypes requires
+    importing every writer, so the registry is saved to REGISTRY_PATH and only
+    regenerated when a writer file has been added, removed, or changed since.
+    '''
+
+    signatures = {name : get_plugin_signature('writers', name) for name in BUILTIN_WRITERS}
+    fresh = None not in signatures.values()
+    key = [REGISTRY_VERSION, str(SNUTREE_ROOT), signatures]
+
+    registry = load_registry()
+    if fresh and registry.get('key') == key:
+        return registry['writers']
+
+    logging.getLogger(__name__).info('Refreshing plugin registry')
+    writers = {name : sorted(get_writer_module(name).filetypes) for name in BUILTIN_WRITERS}
+    if fresh:
+        save_registry({'key' : key, 'writers' : writers})
+
+    return writers
+
+def load_registry():
+    '''
+    Returns the saved plugin registry, or an empty dictionary if there is none
+    or it cannot be read.
+    '''
+    try:
+        with REGISTRY_PATH.open() as f:
+            registry = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return registry if isinstance(registry, dict) else {}
+
+def save_registry(registry):
+    '''
+    Saves the plugin registry, unless it cannot be written (in which case it
+    is simply regenerated next time).
+    '''
+    with atomic_writer(REGISTRY_PATH, 'w', ignore_errors=True) as f:
+        json.dump(registry, f)
+
 def get_module(plugin_base, name, attributes=None, descriptor='module', custom=True):
     '''
     For the given PluginBase, validates the module whose name is given, by
@@ -242,6 +573,7 @@ def get_module(plugin_base, name, attributes=None, descriptor='module', custom=T
 
     return module
 
+@lru_cache(maxsize=None)
 def get_schema_module(name):
     '''
     Return the member table schema module of the given name.
@@ -251,6 +583,7 @@ def get_schema_module(name):
                       descriptor='member schema',
                       custom=True)
 
+@lru_cache(maxsize=None)
 def get_reader_module(filetype):
     '''
     Return the reader module for the given filetype.
@@ -260,6 +593,7 @@ def get_reader_module(filetype):
                       descriptor='input file format',
                       custom=False)
 
+@lru_cache(maxsize=None)
 def get_writer_module(name):
     '''
     Return the writer of the given name.
@@ -287,8 +621,37 @@ def get_config(config_files, config_args):
     be extended, dictionaries recursively updated, and scalars replaced). The
     values in config_args will always be processed last.
     '''
+    return combine_configs(load_config_files(config_files), config_args)
+
+def get_config_args(output_path, input_format, schema, writer, output_format, seed):
+    '''
+    Returns a configuration dictionary made from those parameters of the API
+    functions that can also be included in config files.
+    '''
+    return denullified({
+        'readers' : {
+            'stdin' : {
+                'filetype' : input_format,
+                },
+            },
+        'schema' : {
+            'name' : schema,
+            },
+        'writer' : {
+            'filetype' : output_format,
+            'file' : output_path,
+            'name' : writer,
+            },
+        'seed' : seed,
+        })
+
+def combine_configs(configs, config_args):
+    '''
+    Combines the configuration dictionaries with the configuration arguments
+    (as in get_config), then validates and returns the result.
+    '''
     config = {}
-    for c in load_config_files(config_files) + [config_args]:
+    for c in configs + [config_args]:
         deep_update(config, c)
     return CONFIG_VALIDATOR.validated(config)
 
@@ -298,6 +661,9 @@ def load_config_files(files):
     dictionaries representing each configuraton file.
     '''
 
+    # Only imported when needed, to keep startup fast
+    import yaml
+
     configs = []
     for f in files:
         try:
@@ -318,13 +684,19 @@ def load_config_files(files):
 @logged
 def get_member_table(files, reader_configs):
     '''
-    Retrieves a list of members from the provided files, using the file
+    Retrieves an iterator over members from the provided files, using the file
     extensions to determine what format to interpret the inputs as (stdin will
     use the format provided by reader_configs['stdin']['filetype']). The reader
     may use the dictionary reader_configs[READER_NAME] to configure itself.
+
+    Reader modules are found immediately. Rows of the first file are only read
+    as the returned iterator is consumed, so that a streaming reader never
+    needs to hold a lone table in memory; any other files are read on
+    background threads at the same time. Either way, rows come out in the
+    order the files were given.
     '''
 
-    members = []
+    tables = []
     for f in files:
 
         # Filetype is the path suffix or stdin's format if input is stdin
@@ -337,49 +709,146 @@ def get_member_table(files, reader_configs):
             filetype = Path(f.name).suffix[1:] # ignore first element (a dot)
 
         reader = get_reader_module(filetype)
-        members += reader.get_table(f, **reader_configs.get(filetype, {}))
+        tables.append(reader.get_table(f, **reader_configs.get(filetype, {})))
+
+    # The first table is read as it is consumed, while the rest are read in
+    # the background in the meantime (so that, e.g., large files and slow SQL
+    # queries are read at the same time)
+    return chain.from_iterable(tables[:1] + [read_ahead(table) for table in tables[1:]])
+
+# Number of rows passed between threads at a time by read_ahead
+READ_AHEAD_BATCH_SIZE = 2**10
+
+# Number of batches read_ahead may read before they are consumed
+READ_AHEAD_BATCHES = 4
 
-    return members
+def read_ahead(rows):
+    '''
+    Starts reading the rows on a background thread, and returns an iterator
+    over the rows read, in order. Only a few batches of rows are read ahead of
+    the iterator, so that streaming readers still never hold a whole table in
+    memory. Any exception raised while reading is raised by the iterator once
+    it reaches that point. If the iterator is closed or garbage collected
+    early (even before it is started), reading stops.
+    '''
+
+    batches = queue.Queue(maxsize=READ_AHEAD_BATCHES)
+    stopped = Event()
+
+    def put(item):
+        # Check for a stopped iterator now and then, instead of waiting for
+        # room in the queue forever
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        batch = []
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= READ_AHEAD_BATCH_SIZE:
+                    if not put((batch, None)):
+                        return
+                    batch = []
+        except BaseException as e: # pylint: disable=broad-except
+            put((batch, e))
+        else:
+            put((batch, StopIteration()))
+        finally:
+            # Release the reader's resources (e.g., SQL connections)
+            if hasattr(rows, 'close'):
+                rows.close()
+
+    def rows_read():
+        try:
+            while True:
+                batch, stop = batches.get()
+                yield from batch
+                if isinstance(stop, StopIteration):
+                    return
+                elif stop is not None:
+                    raise stop
+        finally:
+            stopped.set()
+
+    Thread(target=read, daemon=True).start()
+    return ReadAhead(rows_read(), stopped)
+
+class ReadAhead:
+    '''
+    Iterator over the rows read in the background by read_ahead. Closing it,
+    or dropping it, sets the `stopped` event to stop the background reader.
+    (The reader itself holds no reference to this object, so that it can be
+    garbage collected while the reader is still running.)
+    '''
+
+    def __init__(self, rows, stopped):
+        self.rows = rows
+        self.stopped = stopped
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.rows)
+
+    def close(self):
+        self.stopped.set()
+        self.rows.close()
+
+    def __del__(self):
+        self.stopped.set()
 
 def find_writer_module(filetype, writer_name=None):
     '''
     Returns the writer module with the given writer name. If no writer name
-    is given, use the filetype to guess.
+    is given, use the filetype to guess. Only the chosen writer is imported
+    (see get_writer_registry).
     '''
 
     if writer_name is not None:
         return writer_name, get_writer_module(writer_name)
 
     writers = {}
-    for name in BUILTIN_WRITERS:
-        module = get_writer_module(name)
-        for supported_type in module.filetypes:
-            writers.setdefault(supported_type, []).append((name, module))
+    for name, supported_types in sorted(get_writer_registry().items()):
+        for supported_type in supported_types:
+            writers.setdefault(supported_type, []).append(name)
 
     filetype_writers = writers.get(filetype)
     if filetype_writers and len(filetype_writers) == 1:
-        writer_name, module = filetype_writers[0]
-        return writer_name, module
+        writer_name = filetype_writers[0]
+        return writer_name, get_writer_module(writer_name)
     elif not filetype_writers:
         msg = 'format {filetype!r} has no supported writers'.format(filetype=filetype)
         raise SnutreeError(msg)
     else:
-        conflicting_writers = {name for name, _ in filetype_writers}
+        conflicting_writers = set(filetype_writers)
         msg = 'format {filetype!r} has multiple writers; choose a writer from: {conflicting_writers!r}'.format(filetype=filetype, conflicting_writers=conflicting_writers)
         raise SnutreeError(msg)
 
 def write_output(output, path=None):
     '''
     Write the output to a file at the given path. If the path is None, then
-    write to stdout.
+    write to stdout. The output is either bytes or an iterable of chunks of
+    bytes (which are written as they are produced). The file is only opened
+    once the first chunk is available, so output that fails right away (e.g.,
+    because Graphviz rejected its input) does not leave an empty file behind.
     '''
+    chunks = iter([output] if isinstance(output, bytes) else output)
+    first = next(chunks, b'')
     if path is not None:
         stream_open = lambda: path.open('wb+')
     else:
         # Buffer since we are writing binary
         stream_open = contextmanager(lambda: (yield sys.stdout.buffer))
     with stream_open() as f:
-        f.write(output)
+        for chunk in chain([first], chunks):
+            f.write(chunk)
 
 ###############################################################################
 ###############################################################################
@@ -0,0 +1,304 @@
+'''
+Persistent state for incremental rebuilds. A cache directory keeps the output
+of the last run, along with the members validated from each of its rows, all
+keyed by fingerprints of the rows and configuration they came from. On the
+next run, the output is reused outright if nothing changed. Otherwise, only
+the rows that were inserted or changed since the last run are validated again
+(rows that were deleted are simply never looked up).
+
+Reusing members row-by-row is only possible for schemas that convert each row
+independently of the others. Schemas whose to_Members function yields exactly
+one member per row say so by setting `independent_rows = True`. Schemas that
+also make checks across rows, in order, instead provide three functions:
+`chunk_args(**config)` prepares to convert a new table and returns the extra
+arguments of `to_Member_chunk(dicts, *args)`, which converts rows to members
+independently (returning one member, or None, per row, along with the first
+error found), and `from_chunks(chunks)` makes the checks across every row.
+Rows of other schemas are always validated again when anything has changed.
+'''
+
+import hashlib
+import io
+import json
+import logging
+import pickle
+import shutil
+import subprocess
+from functools import reduce
+from pathlib import Path
+from . import get_version
+from .errors import SnutreeError
+from .utilities.filecache import atomic_writer
+
+def fingerprint(obj):
+    '''
+    Returns a hex digest identifying the JSON-like object (e.g., a table row
+    or a configuration dictionary). Dictionaries with equal contents have
+    equal fingerprints, regardless of their key order. Objects that are not
+    JSON-serializable are converted to strings first.
+    '''
+    dumped = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.sha1(dumped.encode('utf-8')).hexdigest()
+
+def source_fingerprint(module):
+    '''
+    Returns a hex digest identifying the source code of the module (e.g., a
+    custom schema or writer module that might have been edited). Modules
+    without a source file (e.g., when frozen) all have the same fingerprint.
+    '''
+    module_file = getattr(module, '__file__', None)
+    source = Path(module_file).read_bytes() if module_file else b''
+    return hashlib.sha1(source).hexdigest()
+
+def graphviz_fingerprint():
+    '''
+    Returns the path and version of the Graphviz dot command, which writers
+    might run to compile the output, or None if it is not installed.
+    '''
+    path = shutil.which('dot')
+    if path is None:
+        return None
+    try:
+        result = subprocess.run([path, '-V'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except (OSError, subprocess.CalledProcessError):
+        return [path, None]
+    return [path, result.stderr.decode('utf-8', errors='replace').strip()]
+
+class BuildCache:
+    '''
+    The state of one incremental build, loaded from and saved to a cache
+    directory. Use BuildCache.read to read the member table, BuildCache.output
+    to check for reusable output, BuildCache.to_Members in place of the
+    schema's own to_Members, and BuildCache.save to store the new output.
+
+    If keep_rows is True (e.g., because the rows themselves will be written),
+    the member table is kept in memory instead of members being cached.
+    '''
+
+    filename = 'snutree-cache.pickle'
+
+    # Increment whenever the format of the saved state changes
+    version = 1
+
+    def __init__(self, directory, schema, writer, config, keep_rows=False):
+
+        self.path = Path(directory)/self.filename
+        self.schema = schema
+        self.schema_config = config['schema']
+        self.keep_rows = keep_rows
+
+        # Members depend on the schema module's code as well as its
+        # configuration (e.g., a custom module might have been edited)
+        self.schema_key = fingerprint([config['schema'], source_fingerprint(schema)])
+
+        # The output also depends on the writer module's code, the version of
+        # snutree, and the Graphviz installation, but not on where it will be
+        # written
+        writer_config = dict(config['writer'], file=None)
+        self.config_key = fingerprint([
+            dict(config, writer=writer_config),
+            self.schema_key,
+            source_fingerprint(writer),
+            get_version(),
+            graphviz_fingerprint(),
+            ])
+
+        # Additional output files written by the writer (see BuildCache.output)
+        self.outputs = [Path(path) for path in config['writer'].get('outputs') or []]
+
+        state = self.load()
+        self.old_output = state.get('output')
+        self.old_members = state.get('members', {}) if state.get('schema') == self.schema_key else {}
+        self.new_members = {}
+        self.output_key = None
+        self.cached_members = False
+
+    def load(self):
+        '''
+        Load and return the saved state dictionary. Return an empty dictionary
+        if there is no saved state or if it cannot be used.
+        '''
+
+        logger = logging.getLogger(__name__)
+
+        try:
+            with self.path.open('rb') as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            msg = 'ignoring unreadable cache file {path!r}:\n{e}'.format(path=str(self.path), e=e)
+            logger.warning(msg)
+            return {}
+
+        if not isinstance(state, dict) or state.get('version') != self.version:
+            logger.info('Ignoring cache file from another version')
+            return {}
+
+        return state
+
+    def save(self, output):
+        '''
+        Save the output of this run, along with the members validated from
+        each of its rows, to the cache directory. The file is replaced
+        atomically, so an interrupted run never leaves a corrupt cache.
+        '''
+
+        state = {
+            'version' : self.version,
+            'schema' : self.schema_key,
+            'members' : self.new_members,
+            'output' : (self.output_key, output),
+        }
+
+        try:
+            with atomic_writer(self.path) as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            msg = 'could not write cache file {path!r}:\n{e}'.format(path=str(self.path), e=e)
+            raise SnutreeError(msg)
+
+    def read(self, table):
+        '''
+        Read the entire member table, fingerprinting each row as it is read to
+        decide (together with the configuration) whether the previous output
+        can be reused. Each inserted or changed row is converted to a member
+        as soon as it is read, so that only the members are kept, not the
+        rows. Returns the table to pass to BuildCache.to_Members.
+        '''
+
+        convert = None if self.keep_rows else self.converter()
+        self.cached_members = convert is not None
+
+        digest = hashlib.sha1(self.config_key.encode('ascii'))
+        kept, validated = [], 0
+        for row in table:
+
+            row_key = fingerprint(row)
+            digest.update(row_key.encode('ascii'))
+
+            if convert is None:
+                kept.append(row)
+                continue
+
+            kept.append(row_key)
+            if row_key in self.new_members:
+                continue
+
+            pickled = self.old_members.get(row_key)
+            if pickled is None:
+                # Pickle right away, before the tree or writer modify the member
+                pickled = self.dumps(convert(row))
+                validated += 1
+            self.new_members[row_key] = pickled
+
+        self.output_key = digest.hexdigest()
+
+        if convert is not None:
+            msg = 'Reused {reused} members from cache and validated {validated} new or changed rows'.format(reused=len(kept) - validated, validated=validated)
+            logging.getLogger(__name__).info(msg)
+
+        return kept
+
+    def converter(self):
+        '''
+        Returns a function converting a single row to a member (or to None, if
+        the schema ignores the row), or None if the schema cannot convert rows
+        independently (see the module docstring).
+        '''
+
+        schema, config = self.schema, self.schema_config
+
+        if getattr(schema, 'independent_rows', False):
+            def convert(row):
+                member, = schema.to_Members([row], **config)
+                return member
+
+        elif all(hasattr(schema, name) for name in ('chunk_args', 'to_Member_chunk', 'from_chunks')):
+            args = schema.chunk_args(**config)
+            def convert(row):
+                members, error = schema.to_Member_chunk([row], *args)
+                if error is not None:
+                    raise error
+                member, = members
+                return member
+
+        else:
+            convert = None
+
+        return convert
+
+    @property
+    def output(self):
+        '''
+        The output of the previous run if it was made from the same table and
+        configuration as this one, or None otherwise. Only valid after `read`.
+        Only the main output is cached, so it is not reused unless every
+        additional output file of the previous run still exists.
+        '''
+        if not all(path.exists() for path in self.outputs):
+            return None
+        if self.old_output and self.old_output[0] == self.output_key:
+            return self.old_output[1]
+        return None
+
+    def to_Members(self, table, **config):
+        '''
+        Convert the table returned by BuildCache.read to member objects, like
+        the schema's own to_Members function, but using the members converted
+        (or found in the cache) while the table was read. Checks across rows
+        are still made for every row.
+        '''
+
+        if not self.cached_members:
+            yield from self.schema.to_Members(table, **config)
+            return
+
+        members = (self.loads(self.new_members[row_key]) for row_key in table)
+        if getattr(self.schema, 'independent_rows', False):
+            yield from members
+        else:
+            self.schema.chunk_args(**config)
+            yield from self.schema.from_chunks(([member], None) for member in members)
+
+    def dumps(self, member):
+        '''
+        Pickle the member. Classes from the schema module are pickled by name,
+        because the module is loaded under a different name on every run.
+        '''
+        f = io.BytesIO()
+        SchemaPickler(f, self.schema).dump(member)
+        return f.getvalue()
+
+    def loads(self, pickled):
+        '''
+        Unpickle a member pickled with BuildCache.dumps.
+        '''
+        return SchemaUnpickler(io.BytesIO(pickled), self.schema).load()
+
+class SchemaPickler(pickle.Pickler):
+    '''
+    Pickler that refers to classes defined in the schema module by their
+    qualified names within that module.
+    '''
+
+    def __init__(self, file, schema):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.schema = schema
+
+    def persistent_id(self, obj):
+        if isinstance(obj, type) and obj.__module__ == self.schema.__name__:
+            return obj.__qualname__
+        return None
+
+class SchemaUnpickler(pickle.Unpickler):
+    '''
+    Unpickler that finds classes pickled by SchemaPickler in the schema module.
+    '''
+
+    def __init__(self, file, schema):
+        super().__init__(file)
+        self.schema = schema
+
+    def persistent_load(self, pid):
+        return reduce(getattr, pid.split('.'), self.schema)
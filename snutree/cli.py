@@ -12,14 +12,16 @@ options can be provided in configuration files.
 
 import logging
 import io
+import os
 import sys
 import argparse
 from argparse import ArgumentParser
 from collections import OrderedDict
 from pathlib import Path
-from . import api, version
+from . import get_version
 from .errors import SnutreeError
 from .utilities.logging import setup_logger, logged
+from .utilities.plugins import get_builtin_plugins
 
 def main():
     '''
@@ -45,27 +47,66 @@ def main():
 def invoke(argv=None):
     '''
     Run snutree using the provided list of command-line arguments. By default,
-    the running script's actual command-line arguments are used.
+    the running script's actual command-line arguments are used. If the first
+    argument is the name of a subcommand (e.g., 'batch'), the remaining
+    arguments are for that subcommand instead, unless a file of that name
+    exists (in which case it is an input file).
     '''
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] and argv[0] in subcommands and not os.path.exists(argv[0]):
+        invoke_subcommand(argv[0], argv[1:])
+        return
+
     log_keys = {'verbose', 'debug', 'quiet', 'log_path'}
     args = vars(parse_args(argv))
     args_log = {k : v for k, v in args.items() if k in log_keys}
     args_api = {k : v for k, v in args.items() if k not in log_keys}
     setup_logger(**args_log)
+
+    # The API pulls in all of snutree's dependencies, so it is only imported
+    # once the arguments are known to be valid (i.e., not for --help)
+    from . import api
     api.generate(**args_api)
 
+def invoke_subcommand(name, argv):
+    '''
+    Run the snutree subcommand of the given name using the provided list of
+    command-line arguments (excluding the subcommand name itself).
+    '''
+    log_keys = {'verbose', 'debug', 'quiet', 'log_path'}
+    args = vars(parse_subcommand_args(name, argv))
+    args_log = {k : v for k, v in args.items() if k in log_keys}
+    args_api = {k : v for k, v in args.items() if k not in log_keys}
+    setup_logger(**args_log)
+    _, _, function = subcommands[name]
+    function(**args_api)
+
 def parse_args(argv=None):
     '''
     Parse and return the program command-line arguments. If the `argv` variable
     is provided, arguments are read from that list instead of using the true
     command-line arguments.
     '''
-    parser = ArgumentParser(prog='snutree', description=__doc__)
+    epilog = "Run 'snutree batch -h' for help with creating many trees at once, or 'snutree serve -h' for help with running a render server."
+    parser = ArgumentParser(prog='snutree', description=__doc__, epilog=epilog)
     for args, kwargs in options.values():
         parser.add_argument(*args, **kwargs)
     parsed = parser.parse_args(argv)
     return parsed
 
+def parse_subcommand_args(name, argv):
+    '''
+    Parse and return the command-line arguments in the list for the snutree
+    subcommand of the given name.
+    '''
+    description, subcommand_options, _ = subcommands[name]
+    parser = ArgumentParser(prog='snutree {name}'.format(name=name), description=description)
+    for args, kwargs in subcommand_options.values():
+        parser.add_argument(*args, **kwargs)
+    parsed = parser.parse_args(argv)
+    return parsed
+
 class AllowedModules:
     '''
     Collection of allowable module names. If `pattern` is provided to the
@@ -102,9 +143,22 @@ class AllowedModules:
         return '{{{allowed}}}'.format(allowed=','.join(self))
 
 # Allowable values for different arguments
-CHOICES_READER = AllowedModules(api.BUILTIN_READERS, pattern=None)
-CHOICES_SCHEMA = AllowedModules(api.BUILTIN_SCHEMAS, pattern='*.py')
-CHOICES_WRITER = AllowedModules(api.BUILTIN_WRITERS, pattern='*.py')
+CHOICES_READER = AllowedModules(get_builtin_plugins('readers'), pattern=None)
+CHOICES_SCHEMA = AllowedModules(get_builtin_plugins('schemas'), pattern='*.py')
+CHOICES_WRITER = AllowedModules(get_builtin_plugins('writers'), pattern='*.py')
+
+class VersionAction(argparse.Action):
+    '''
+    Like argparse's 'version' action, except that the version is only looked
+    up when the option is actually used (looking it up is slow).
+    '''
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help="show program's version number and exit"): # pylint: disable=redefined-builtin
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(get_version())
+        parser.exit()
 
 class FileType(argparse.FileType):
     '''
@@ -207,6 +261,13 @@ options = OrderedDict([
         'help' : 'random number generator seed, for moving tree nodes around in a repeatable way'
     })),
 
+    ('cache', (['--cache'], {
+        'metavar' : '<path>',
+        'dest' : 'cache_path',
+        'type' : Path,
+        'help' : 'directory to keep state in between runs, so that later runs only revalidate inserted or changed rows'
+    })),
+
     ('log', (['-l', '--log'], {
         'metavar' : '<path>',
         'dest' : 'log_path',
@@ -230,9 +291,113 @@ options = OrderedDict([
     })),
 
     ('version', (['-V', '--version'], {
-        'action' : 'version',
-        'version' : version,
+        'action' : VersionAction,
     })),
 
 ])
 
+BATCH_DESCRIPTION = '''
+Creates many trees at once, one for each job in the YAML <manifest> file. The
+manifest has a list of 'jobs' and an optional dictionary of 'defaults' for
+them. Each job may have the keys 'input' (a list of paths), 'output',
+'config' (a list of paths), 'to', 'schema', 'writer', 'seed', and 'cache',
+which mean the same as the options of the same names. Relative paths are
+relative to the manifest. Jobs run in parallel, and input files shared by
+several jobs are only read once by each worker process.
+'''
+
+batch_options = OrderedDict([
+
+    ('manifest', (['manifest_file'], {
+        'metavar' : '<manifest>',
+        'type' : FileType('r', encoding='utf-8'),
+        'help' : "the batch manifest file or '-' for stdin",
+    })),
+
+    ('jobs', (['-j', '--jobs'], {
+        'metavar' : '<int>',
+        'dest' : 'workers',
+        'type' : int,
+        'help' : 'number of jobs to run at once; default is the number of CPUs',
+    })),
+
+    ('log', options['log']),
+    ('quiet', options['quiet']),
+    ('verbose', options['verbose']),
+    ('debug', options['debug']),
+
+])
+
+def generate_batch(**kwargs):
+    from . import api
+    api.generate_batch(**kwargs)
+
+SERVE_DESCRIPTION = '''
+Runs a local HTTP server that renders trees on request, keeping modules and
+caches loaded between requests. POST a JSON object to /render with the
+'members' (a list of member dictionaries) and, optionally, 'config' (as in a
+configuration file), 'format', 'schema', 'writer', and 'seed'. The response
+is the rendered output.
+'''
+
+serve_options = OrderedDict([
+
+    ('host', (['--host'], {
+        'metavar' : '<host>',
+        'default' : '127.0.0.1',
+        'help' : 'host to listen on; default is 127.0.0.1',
+    })),
+
+    ('port', (['-p', '--port'], {
+        'metavar' : '<int>',
+        'type' : int,
+        'default' : 8000,
+        'help' : 'port to listen on; default is 8000',
+    })),
+
+    ('socket', (['--socket'], {
+        'metavar' : '<path>',
+        'dest' : 'socket_path',
+        'type' : Path,
+        'help' : 'listen on the Unix socket at <path> instead of a port',
+    })),
+
+    ('jobs', (['-j', '--jobs'], {
+        'metavar' : '<int>',
+        'dest' : 'workers',
+        'type' : int,
+        'help' : 'number of trees to render at once; default is the number of CPUs',
+    })),
+
+    ('queue', (['--queue'], {
+        'metavar' : '<int>',
+        'dest' : 'queue_size',
+        'type' : int,
+        'default' : 16,
+        'help' : 'number of requests that may wait for a worker before more are turned away; default is 16',
+    })),
+
+    ('graphviz_cache', (['--graphviz-cache'], {
+        'metavar' : '<path>',
+        'dest' : 'graphviz_cache',
+        'type' : Path,
+        'help' : 'directory to cache Graphviz output in, shared by all requests',
+    })),
+
+    ('log', options['log']),
+    ('quiet', options['quiet']),
+    ('verbose', options['verbose']),
+    ('debug', options['debug']),
+
+])
+
+def serve(**kwargs):
+    from . import server
+    server.serve(**kwargs)
+
+# Subcommand name => (description, options, function called with the parsed
+# arguments); the functions import the API only when they are run
+subcommands = OrderedDict([
+    ('batch', (BATCH_DESCRIPTION, batch_options, generate_batch)),
+    ('serve', (SERVE_DESCRIPTION, serve_options, serve)),
+])
@@ -24,7 +24,7 @@ class SnutreeSchemaError(SnutreeError):
         '''
         Store the original validation error along with the data that caused.
         '''
-        super().__init__()
+        super().__init__(error, data) # Arguments kept so errors can be pickled
         self.error = error
         self.data = data
 
@@ -6,21 +6,26 @@ CONFIG_SCHEMA = {} # No configuration
 
 def get_table(bytesio, **config):
     '''
-    Read a CSV from the stream and return a list of member dictionaries.
+    Read a CSV from the stream and yield member dictionaries one at a time, as
+    they are read (i.e., the whole table is never held in memory at once).
     '''
 
     textio = io.TextIOWrapper(bytesio, encoding='utf-8')
+    rows = csv.DictReader(textio, strict=True)
 
-    try:
-        rows = list(csv.DictReader(textio, strict=True))
-    except csv.Error as e:
-        msg = 'could not read csv:\n{e}'.format(e=e)
-        raise SnutreeReaderError(msg)
+    while True:
+
+        # Errors are raised lazily, when the offending line is reached
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            msg = 'could not read csv:\n{e}'.format(e=e)
+            raise SnutreeReaderError(msg)
 
-    for row in rows:
         # Delete falsy values to simplify validation
         for key, field in list(row.items()):
             if not field:
                 del row[key]
         yield row
-
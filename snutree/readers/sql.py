@@ -1,5 +1,6 @@
+import atexit
 import io
-from contextlib import closing
+from threading import Lock
 from snutree.errors import SnutreeReaderError
 from snutree.utilities.cerberus import Validator
 
@@ -33,6 +34,19 @@ CONFIG_SCHEMA = {
         'type' : 'string',
     },
 
+    'stream' : {
+        'description' : 'stream rows from the server as they are read, instead of reading the entire result first',
+        'type' : 'boolean',
+        'default' : True,
+    },
+
+    'batch_size' : {
+        'description' : 'number of rows fetched from the server at a time',
+        'type' : 'integer',
+        'min' : 1,
+        'default' : 1000,
+    },
+
     # SSH for remote SQL databases
     'ssh' : {
         'description' : 'credentials to encrypt SQL connection with SSH',
@@ -67,7 +81,8 @@ CONFIG_VALIDATOR = Validator(CONFIG_SCHEMA)
 def get_table(bytesio, **config):
     '''
     Read a YAML table with query, SQL and, optionally, ssh information. Use the
-    information to get a list of member dictionaries.
+    information to get member dictionaries, which are yielded as they arrive
+    from the database.
     '''
 
     textio = io.TextIOWrapper(bytesio, encoding='utf-8')
@@ -83,22 +98,33 @@ def get_table(bytesio, **config):
 
 def get_members(query, config):
     '''
-    Validate the configuration file and use it to get and return a table of
-    members from the configuration's SQL database.
+    Validate the configuration file and use it to get an iterator over a table
+    of members from the configuration's SQL database.
     '''
 
     config = CONFIG_VALIDATOR.validated(config)
     ssh_config = config.get('ssh')
     sql_config = config.copy()
     sql_config.pop('ssh', None)
+    fetch_config = {key : sql_config.pop(key) for key in ('stream', 'batch_size')}
     if ssh_config:
-        return get_members_ssh(query, sql_config, ssh_config)
+        return get_members_ssh(query, sql_config, ssh_config, **fetch_config)
     else:
-        return get_members_local(query, sql_config)
+        return get_members_local(query, sql_config, **fetch_config)
 
-def get_members_local(query, sql_config):
+def get_members_local(query, sql_config, stream=True, batch_size=1000):
     '''
-    Use the query and SQL configuration to get a table of members.
+    Use the query and SQL configuration to get an iterator over a table of
+    members. The query is only run once the first row is requested, and rows
+    are fetched from the server, batch_size rows at a time, as the iterator is
+    consumed.
+
+    If stream is True, an unbuffered (server-side) cursor is used, so that
+    rows are only held in memory one batch at a time. Otherwise, the entire
+    result is read when the query is run.
+
+    Connections are taken from the connection pool, and returned to it once
+    every row has been read.
     '''
 
     try:
@@ -109,19 +135,47 @@ def get_members_local(query, sql_config):
 
     import MySQLdb.cursors
 
+    cursor_class = MySQLdb.cursors.SSDictCursor if stream else MySQLdb.cursors.DictCursor
+    connect = lambda: MySQLdb.Connection(**sql_config)
+    return fetch_rows(query, frozen(sql_config), connect, cursor_class, batch_size, MySQLdb.MySQLError)
+
+def fetch_rows(query, key, connect, cursor_class, batch_size, error_type):
+    '''
+    Run the query and yield its rows, fetching batch_size rows at a time. The
+    connection is taken from the pool under the key (or made by calling
+    `connect`) only once the first row is requested. Once all of the rows have
+    been read, the connection is returned to the pool; if reading fails or
+    stops early, it is closed instead, since it might still have unread rows.
+    Errors of the error_type are reported as reader errors.
+    '''
+
+    cxn = None
+    done = False
     try:
-        with closing(MySQLdb.Connection(**sql_config)) as cxn:
-            with cxn.cursor(MySQLdb.cursors.DictCursor) as cursor:
-                cursor.execute(query)
-                return cursor.fetchall()
-    except MySQLdb.MySQLError as e:
+        cxn = POOL.connection(key, connect)
+        cursor = cxn.cursor(cursor_class)
+        cursor.execute(query)
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            yield from rows
+            rows = cursor.fetchmany(batch_size)
+        cursor.close()
+        done = True
+    except error_type as e:
         msg = 'problem reading SQL database:\n{e}'.format(e=e)
         raise SnutreeReaderError(msg)
+    finally:
+        if cxn is not None and done:
+            POOL.release(key, cxn)
+        elif cxn is not None:
+            cxn.close()
 
-def get_members_ssh(query, sql, ssh):
+def get_members_ssh(query, sql, ssh, **fetch_config):
     '''
-    Use the query, SQL, and SSH configurations to get a table of members from
-    a database through an SSH tunnel.
+    Use the query, SQL, and SSH configurations to get an iterator over a table
+    of members from a database through an SSH tunnel. Tunnels are kept open in
+    the connection pool and shared by every query using the same SSH and SQL
+    settings. (See get_members_local for the keyword arguments.)
     '''
 
     options = {
@@ -138,15 +192,102 @@ def get_members_ssh(query, sql, ssh):
         raise SnutreeReaderError(msg)
 
     try:
-
-        with SSHTunnelForwarder(**options) as tunnel:
-            tunneled_sql = sql.copy()
-            tunneled_sql['port'] = tunnel.local_bind_port
-            return get_members_local(query, tunneled_sql)
-
+        tunnel = POOL.tunnel(frozen(options), lambda: SSHTunnelForwarder(**options))
     # The sshtunnel module lets invalid assertions and value errors go
     # untouched, so catch them too
     except (BaseSSHTunnelForwarderError, AssertionError, ValueError) as e:
         msg = 'problem connecting via ssh:\n{e}'.format(e=e)
         raise SnutreeReaderError(msg)
 
+    tunneled_sql = sql.copy()
+    tunneled_sql['port'] = tunnel.local_bind_port
+    return get_members_local(query, tunneled_sql, **fetch_config)
+
+###############################################################################
+###############################################################################
+#### Connection Pool                                                       ####
+###############################################################################
+###############################################################################
+
+def frozen(config):
+    '''
+    Returns a hashable version of the flat configuration dictionary.
+    '''
+    return tuple(sorted(config.items()))
+
+class ConnectionPool:
+    '''
+    Keeps SSH tunnels and SQL connections open between queries, so that the
+    SQL inputs of a run (and of later runs in the same process, such as batch
+    jobs or render server requests) do not each pay for a new SSH handshake
+    and SQL login. Tunnels and connections are keyed by the settings used to
+    create them.
+
+    Tunnels are shared by any number of queries at once. Each connection is
+    only used by one query at a time: it is taken out of the pool for the
+    query and released back into it once the query's rows have been read.
+    '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.tunnels = {} # Key => started tunnel
+        self.connections = {} # Key => list of idle connections
+        atexit.register(self.close)
+
+    def tunnel(self, key, create):
+        '''
+        Returns the active tunnel stored under the key, or creates, starts, and
+        stores a new one by calling `create` if there is none.
+        '''
+        with self.lock:
+            tunnel = self.tunnels.get(key)
+            if tunnel is None or not tunnel.is_active:
+                tunnel = create()
+                tunnel.start()
+                self.tunnels[key] = tunnel
+            return tunnel
+
+    def connection(self, key, create):
+        '''
+        Takes an idle connection stored under the key out of the pool, or
+        creates a new one by calling `create` if there is none. Idle
+        connections that have gone stale (e.g., timed out) are discarded.
+        '''
+
+        while True:
+            with self.lock:
+                idle = self.connections.get(key)
+                if not idle:
+                    break
+                cxn = idle.pop()
+            try:
+                cxn.ping()
+                return cxn
+            except Exception: # pylint: disable=broad-except
+                cxn.close()
+
+        return create()
+
+    def release(self, key, cxn):
+        '''
+        Returns the connection to the pool, under the key it was created with.
+        '''
+        with self.lock:
+            self.connections.setdefault(key, []).append(cxn)
+
+    def close(self):
+        '''
+        Closes every idle connection and tunnel in the pool.
+        '''
+        with self.lock:
+            connections = [cxn for idle in self.connections.values() for cxn in idle]
+            tunnels = list(self.tunnels.values())
+            self.connections.clear()
+            self.tunnels.clear()
+        for cxn in connections:
+            cxn.close()
+        for tunnel in tunnels:
+            tunnel.stop()
+
+# The connection pool shared by every SQL input read by this process
+POOL = ConnectionPool()
@@ -1,13 +1,15 @@
 from voluptuous import Schema, Required, Coerce
 from voluptuous.error import Error
-from voluptuous.humanize import validate_with_humanized_errors
 from snutree.errors import SnutreeSchemaError
 from snutree.tree import Member
-from snutree.utilities.voluptuous import NonEmptyString
+from snutree.utilities.voluptuous import NonEmptyString, CompiledSchema
 from snutree.utilities.semester import Semester
 
 Rank = Semester
 
+# Each row is converted independently of the others (see snutree.cache)
+independent_rows = True
+
 def to_Members(dicts, **config):
     '''
     Convert member dictionaries to member objects.
@@ -35,6 +37,8 @@ class KeylessMember(Member):
         Required('semester') : Coerce(Rank),
         })
 
+    validator = CompiledSchema(schema)
+
     def __init__(self,
                  name=None,
                  semester=None,
@@ -47,7 +51,7 @@ class KeylessMember(Member):
 
     @classmethod
     def validate_dict(cls, dct):
-        return validate_with_humanized_errors(dct, cls.schema)
+        return cls.validator(dct)
 
     @classmethod
     def from_dict(cls, dct):
@@ -1,12 +1,14 @@
 from voluptuous import Schema, Required, Coerce
 from voluptuous.error import Error
-from voluptuous.humanize import validate_with_humanized_errors
 from snutree.errors import SnutreeSchemaError
 from snutree.tree import Member
-from snutree.utilities.voluptuous import NonEmptyString
+from snutree.utilities.voluptuous import NonEmptyString, CompiledSchema
 
 Rank = int
 
+# Each row is converted independently of the others (see snutree.cache)
+independent_rows = True
+
 def to_Members(dicts, **config):
     '''
     Validate a table of chapters dictionaries.
@@ -34,6 +36,8 @@ class Chapter(Member):
         Required('founded') : Coerce(Rank)
         })
 
+    validator = CompiledSchema(schema)
+
     def __init__(self,
                  parent=None,
                  child=None,
@@ -50,7 +54,7 @@ class Chapter(Member):
 
     @classmethod
     def validate_dict(cls, dct):
-        return validate_with_humanized_errors(dct, cls.schema)
+        return cls.validator(dct)
 
     @classmethod
     def from_dict(cls, dct):
@@ -1,13 +1,15 @@
 from voluptuous import Schema, Required, Coerce
 from voluptuous.error import Error
-from voluptuous.humanize import validate_with_humanized_errors
 from snutree.errors import SnutreeSchemaError
 from snutree.tree import Member
-from snutree.utilities.voluptuous import NonEmptyString
+from snutree.utilities.voluptuous import NonEmptyString, CompiledSchema
 from snutree.utilities.semester import Semester
 
 Rank = Semester
 
+# Each row is converted independently of the others (see snutree.cache)
+independent_rows = True
+
 def to_Members(dicts, **config):
     '''
     Validate a table of keyed member dictionaries.
@@ -37,6 +39,8 @@ class KeyedMember(Member):
         Required('semester') : Coerce(Rank),
     })
 
+    validator = CompiledSchema(schema)
+
     def __init__(self,
                  key=None,
                  name=None,
@@ -51,7 +55,7 @@ class KeyedMember(Member):
 
     @classmethod
     def validate_dict(cls, dct):
-        return validate_with_humanized_errors(dct, cls.schema)
+        return cls.validator(dct)
 
     @classmethod
     def from_dict(cls, dct):
@@ -1,14 +1,17 @@
 import difflib
 import pprint
 import re
+import sys
+from functools import lru_cache
 from abc import ABCMeta, abstractmethod
 from voluptuous import Schema, Required, In, Coerce, IsFalse
 from voluptuous.error import Error
-from voluptuous.humanize import validate_with_humanized_errors
 from snutree.errors import SnutreeError, SnutreeSchemaError
 from snutree.tree import Member
 from snutree.utilities.cerberus import Validator
-from snutree.utilities.voluptuous import NonEmptyString, Digits
+from snutree.utilities.interning import InternTable
+from snutree.utilities.parallel import map_chunks
+from snutree.utilities.voluptuous import NonEmptyString, Digits, CompiledSchema
 from snutree.utilities.semester import Semester
 
 CONFIG_SCHEMA = {
@@ -21,7 +24,13 @@ CONFIG_SCHEMA = {
         'description' : 'the chapter whose family tree will be generated',
         'type' : 'string',
         'required' : True,
-    }
+    },
+    'workers' : {
+        'description' : 'number of processes used to validate rows (rows are validated in this process by default)',
+        'type' : 'integer',
+        'min' : 1,
+        'default' : 1,
+    },
 }
 
 SIGMANU_VALIDATOR = Validator(CONFIG_SCHEMA)
@@ -35,30 +44,97 @@ def to_Members(dicts, **config):
     (or ignored, in the case of Reaffiliates), and make sure there are no
     duplicate affiliations. The name of the chapter the family tree will be
     made for should be in config['chapter'].
+
+    If config['workers'] is more than one, rows are validated in that many
+    worker processes. Checks that span several rows (i.e., for duplicate
+    affiliations and generated keys) are still made here, in order (see
+    from_chunks).
     '''
 
-    chapter = SIGMANU_VALIDATOR.validated(config or {})['chapter']
+    config = SIGMANU_VALIDATOR.validated(config or {})
+    args = chunk_args(**config)
+
+    if config['workers'] > 1:
+        chunks = map_chunks(sys.modules[__name__], config['name'], 'to_Member_chunk', args, dicts, config['workers'])
+    else:
+        chunks = (to_Member_chunk([dct], *args) for dct in dicts)
+
+    yield from from_chunks(chunks)
+
+def chunk_args(**config):
+    '''
+    Prepare to convert a member table with to_Member_chunk and from_chunks,
+    for the given configuration. Returns the arguments to_Member_chunk takes
+    after the member dictionaries. (The build cache uses these functions to
+    convert only the rows that changed since its last run; see snutree.cache.)
+    '''
+
+    config = SIGMANU_VALIDATOR.validated(config or {})
     try:
-        SigmaNuMember.chapter = Affiliation.str_to_designation(chapter)
+        SigmaNuMember.chapter = Affiliation.str_to_designation(config['chapter'])
     except ValueError as e:
         raise SnutreeSchemaError(e, config)
 
+    return (SigmaNuMember.chapter,)
+
+def to_Member(dct):
+    '''
+    Convert a single member dictionary to a member object, or to None if the
+    member is ignored (i.e., a Reaffiliate).
+    '''
+
+    status = dct.get('status')
+
+    if status not in MemberTypes:
+        valid_statuses, member = VALID_STATUSES, pprint.pformat(dct)
+        msg = 'status must be one of {valid_statuses}, in:\n{member}'.format(valid_statuses=valid_statuses, member=member)
+        raise SnutreeError(msg)
+
+    if status == 'Reaffiliate':
+        return None
+
     try:
+        return MemberTypes[status].from_dict(dct)
+    except Error as e:
+        raise SnutreeSchemaError(e, dct)
+
+def to_Member_chunk(dicts, chapter):
+    '''
+    Convert a chunk of member dictionaries with to_Member in a worker process,
+    for the given primary chapter. Returns the members converted before the
+    first error (if any), along with that error.
+    '''
 
-        used_affiliations = set()
+    SigmaNuMember.chapter = chapter
+
+    members = []
+    try:
         for dct in dicts:
+            members.append(to_Member(dct))
+    except SnutreeError as e:
+        return members, e
 
-            status = dct.get('status')
+    return members, None
 
-            if status not in MemberTypes:
-                valid_statuses, member = VALID_STATUSES, pprint.pformat(dct)
-                msg = 'status must be one of {valid_statuses}, in:\n{member}'.format(valid_statuses=valid_statuses, member=member)
-                raise SnutreeError(msg)
+def from_chunks(chunks):
+    '''
+    Yield the members of chunks converted by to_Member_chunk, in order, and
+    raise the first error found. Ignored members are dropped, duplicate
+    affiliations are found, and members without badges are given keys here,
+    since each chunk is converted without knowing what came before it.
+    '''
 
-            if status == 'Reaffiliate':
-                continue
+    # Generated keys are numbered from zero for every table
+    Brother.bid = 0
+    Candidate.cid = 0
+
+    used_affiliations = set()
+    for members, error in chunks:
 
-            member = MemberTypes[status].from_dict(dct)
+        for member in members:
+
+            if member is None:
+                continue
 
             for affiliation in member.affiliations:
                 if affiliation in used_affiliations:
@@ -66,10 +142,13 @@ def to_Members(dicts, **config):
                     raise SnutreeError(msg)
                 used_affiliations.add(affiliation)
 
+            if isinstance(member, (Brother, Candidate)):
+                member.key = member.next_key()
+
             yield member
 
-    except Error as e:
-        raise SnutreeSchemaError(e, dct)
+        if error is not None:
+            raise error
 
 class Affiliation:
     '''
@@ -176,9 +255,17 @@ class Affiliation:
     # Matches a single Greek-letter chapter designation
     DESIGNATION_MATCHER = re.compile('^({DESIGNATION_TOKEN})+$'.format(DESIGNATION_TOKEN=DESIGNATION_TOKEN))
 
-    def __init__(self, *args):
+    # Affiliations are interned: each distinct affiliation is created once,
+    # and each distinct affiliation string or chapter identifier is parsed
+    # once, after which the results are reused
+    CACHE_SIZE = 2**18
+    interned = InternTable(CACHE_SIZE) # (Designation, badge) => Affiliation
+    parsed = InternTable(CACHE_SIZE) # Affiliation string => Affiliation
+    designations = InternTable(CACHE_SIZE) # Chapter identifier => designation
+
+    def __new__(cls, *args):
         '''
-        Initialize a chapter affiliation based on args.
+        Create a chapter affiliation based on args (or reuse an existing one).
 
         If args is a string, it should be of the form '<chapter_id> <badge>'
         where <badge> is the badge number and <chapter_id> is an identifier for
@@ -194,8 +281,12 @@ class Affiliation:
 
         if len(args) == 1 and isinstance(args[0], str):
 
+            affiliation = cls.parsed.get(args[0])
+            if affiliation is not None:
+                return affiliation
+
             # Split into the name half and the digit half, ignoring whitespace
-            match = self.AFFILIATION_MATCHER.match(args[0].strip())
+            match = cls.AFFILIATION_MATCHER.match(args[0].strip())
             if not match:
                 arg = args[0]
                 msg = 'expected a chapter name followed by a badge number but got {arg!r}'.format(arg=arg)
@@ -211,8 +302,21 @@ class Affiliation:
             msg = 'expected *(str,) or *(str, int) but got *{args}'.format(args=args)
             raise TypeError(msg)
 
-        self.designation = self.str_to_designation(designation)
-        self.badge = badge
+        designation = cls.str_to_designation(designation)
+        affiliation = cls.interned.get((designation, badge))
+        if affiliation is None:
+            affiliation = super().__new__(cls)
+            affiliation.designation = designation
+            affiliation.badge = badge
+            cls.interned.add((designation, badge), affiliation)
+
+        if len(args) == 1:
+            cls.parsed.add(args[0], affiliation)
+
+        return affiliation
+
+    def __getnewargs__(self):
+        return self.designation, self.badge
 
     @classmethod
     def str_to_designation(cls, string):
@@ -220,6 +324,17 @@ class Affiliation:
         Convert the string to a Greek-letter chapter designation, and return it
         as another string.
         '''
+        designation = cls.designations.get(string)
+        if designation is None:
+            designation = cls.designations.add(string, cls.parse_designation(string))
+        return designation
+
+    @classmethod
+    def parse_designation(cls, string):
+        '''
+        Parse the string as a Greek-letter chapter designation (see
+        str_to_designation), without using the cache.
+        '''
 
         # Standardize
         words = [w.title() for w in string.split()]
@@ -255,16 +370,29 @@ class Affiliation:
     def __repr__(self):
         return str(self)
 
+    def sort_key(self):
+        '''
+        Returns the key affiliations are sorted by: whether the chapter is the
+        primary chapter, then the chapter itself, and then the badge. The key
+        is saved until the primary chapter changes.
+        '''
+        chapter = SigmaNuMember.chapter
+        if self.sort_chapter is not chapter:
+            self.sort_chapter = chapter
+            self.saved_sort_key = (self.designation != chapter, self.designation, self.badge)
+        return self.saved_sort_key
+
+    # The primary chapter the saved sort key was made for, and the key
+    sort_chapter = None
+    saved_sort_key = None
+
     def __lt__(self, other):
         '''
-        Affiliations are sorted by whether the chapter is the primary chapter,
-        then by the chapter itself, and then the badge.
+        Affiliations are sorted by their sort keys.
         '''
         if not isinstance(other, Affiliation):
             return NotImplemented
-        key_self = (self.designation != SigmaNuMember.chapter, self.designation, self.badge)
-        key_other = (other.designation != SigmaNuMember.chapter, other.designation, other.badge)
-        return  key_self < key_other
+        return self.sort_key() < other.sort_key()
 
     def __eq__(self, other):
         return isinstance(other, Affiliation) and \
@@ -284,10 +412,10 @@ class SigmaNuMember(Member, metaclass=ABCMeta):
 
     chapter = NotImplemented
     schema = NotImplemented
+    validator = NotImplemented
 
-    @property
-    def name(self):
-        return combine_names(self.first_name, self.preferred_name, self.last_name)
+    # Subclasses set the name when created (see combine_names)
+    name = NotImplemented
 
     @property
     @abstractmethod
@@ -296,7 +424,7 @@ class SigmaNuMember(Member, metaclass=ABCMeta):
 
     @classmethod
     def validate_dict(cls, dct):
-        return validate_with_humanized_errors(dct, cls.schema)
+        return cls.validator(dct)
 
     @classmethod
     def from_dict(cls, dct):
@@ -324,6 +452,8 @@ class Knight(SigmaNuMember):
         'affiliations' : AffiliationsList,
         })
 
+    validator = CompiledSchema(schema)
+
     def __init__(self,
                  status=None,
                  badge=None,
@@ -339,14 +469,24 @@ class Knight(SigmaNuMember):
         self.first_name = first_name
         self.preferred_name = preferred_name
         self.last_name = last_name
+        self.name = combine_names(first_name, preferred_name, last_name)
         self.parent = big_badge
         self.rank = semester
         self.affiliations = set(affiliations or []) | {Affiliation(self.chapter, int(badge))}
 
     @property
     def label(self):
-        affiliations = ', '.join([str(s) for s in sorted(self.affiliations)])
-        return  '{name}\\n{affiliations}'.format(name=self.name, affiliations=affiliations)
+        # Saved until the primary chapter (and so the order) changes
+        chapter = SigmaNuMember.chapter
+        if self.label_chapter is not chapter:
+            affiliations = ', '.join([str(s) for s in sorted(self.affiliations, key=Affiliation.sort_key)])
+            self.label_chapter = chapter
+            self.saved_label = '{name}\\n{affiliations}'.format(name=self.name, affiliations=affiliations)
+        return self.saved_label
+
+    # The primary chapter the saved label was made for, and the label
+    label_chapter = None
+    saved_label = None
 
 class Brother(SigmaNuMember):
     '''
@@ -368,6 +508,8 @@ class Brother(SigmaNuMember):
         'affiliations' : IsFalse,
         })
 
+    validator = CompiledSchema(schema)
+
     bid = 0
 
     def __init__(self,
@@ -384,9 +526,14 @@ class Brother(SigmaNuMember):
         self.rank = semester
         self.affiliations = []
 
-        # Without badges, keys need to be generated
-        self.key = 'Brother {bid}'.format(bid=Brother.bid)
+        # Without badges, keys need to be generated (see from_chunks)
+        self.key = None
+
+    @staticmethod
+    def next_key():
+        key = 'Brother {bid}'.format(bid=Brother.bid)
         Brother.bid += 1
+        return key
 
     @property
     def name(self):
@@ -413,6 +560,8 @@ class Candidate(SigmaNuMember):
         'affiliations' : IsFalse,
         })
 
+    validator = CompiledSchema(schema)
+
     cid = 0
 
     def __init__(self,
@@ -427,13 +576,19 @@ class Candidate(SigmaNuMember):
         self.first_name = first_name
         self.preferred_name = preferred_name
         self.last_name = last_name
+        self.name = combine_names(first_name, preferred_name, last_name)
         self.parent = big_badge
         self.rank = semester
         self.affiliations = []
 
-        # Without badges, keys need to be generated
-        self.key = 'Candidate {cid}'.format(cid=Candidate.cid)
+        # Without badges, keys need to be generated (see from_chunks)
+        self.key = None
+
+    @staticmethod
+    def next_key():
+        key = 'Candidate {cid}'.format(cid=Candidate.cid)
         Candidate.cid += 1
+        return key
 
     @property
     def label(self):
@@ -460,6 +615,8 @@ class Expelled(Knight):
         'affiliations' : AffiliationsList,
         })
 
+    validator = CompiledSchema(schema)
+
     name = 'Member Expelled'
 
     def __init__(self,
@@ -510,6 +667,7 @@ description = {
     'affiliations' : '''Comma-separated list of chapter badges (e.g., "Alpha 5, Ω 15, HM(A)")''',
 }
 
+@lru_cache(maxsize=2**12)
 def combine_names(first_name, preferred_name, last_name, threshold=.5):
     '''
     This function returns:
@@ -541,8 +699,19 @@ def combine_names(first_name, preferred_name, last_name, threshold=.5):
     # ratio() is expensive, so first make sure the strings aren't actually equal
     if not preferred_name or preferred_name == first_name:
         pass
-    elif difflib.SequenceMatcher(None, preferred_name, last_name).ratio() < threshold:
+    elif not similar(preferred_name, last_name, threshold):
         first_name = preferred_name
 
     return '{first_name} {last_name}'.format(first_name=first_name, last_name=last_name)
 
+def similar(a, b, threshold):
+    '''
+    Returns True if and only if the similarity ratio of the two strings (see
+    difflib.SequenceMatcher.ratio) is at least the threshold. The cheap upper
+    bounds of the ratio are checked first, so the full ratio is only computed
+    when they are not enough to decide.
+    '''
+    matcher = difflib.SequenceMatcher(None, a, b)
+    return matcher.real_quick_ratio() >= threshold \
+            and matcher.quick_ratio() >= threshold \
+            and matcher.ratio() >= threshold
@@ -0,0 +1,269 @@
+'''
+A long-running HTTP service that renders family trees on request. Keeping the
+service running avoids paying for Python startup and plugin loading on every
+tree, and lets schema modules, validators, and caches stay warm in the worker
+processes between requests.
+
+Trees are requested by POSTing a JSON object to /render (see REQUEST_SCHEMA).
+The response body is the output in the requested format. Expected errors
+(e.g., invalid member tables) produce a 400 response whose body is the error
+message, and a 503 response means that too many requests are already waiting.
+'''
+
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import BoundedSemaphore
+from . import api
+from .errors import SnutreeError
+from .utilities.cerberus import Validator
+
+logger_name = 'snutree.server'
+
+###############################################################################
+###############################################################################
+#### Server                                                                ####
+###############################################################################
+###############################################################################
+
+def serve(host='127.0.0.1', port=8000, socket_path=None, workers=None, queue_size=16, graphviz_cache=None):
+    '''
+    Run the render server until interrupted. The server listens on the Unix
+    socket at socket_path if one is given, and on the host and port otherwise.
+    Trees are rendered on a pool of worker processes (one per CPU unless the
+    number of workers is given); at most queue_size requests wait for a free
+    worker, and any more are turned away. If a graphviz_cache directory is
+    given, Graphviz output is cached in it and shared by all requests.
+    '''
+
+    logger = logging.getLogger(logger_name)
+
+    workers = workers or os.cpu_count() or 1
+    if socket_path is not None:
+        server = UnixRenderServer(str(socket_path), workers, queue_size, graphviz_cache)
+        address = str(socket_path)
+    else:
+        server = RenderServer((host, port), workers, queue_size, graphviz_cache)
+        address = '{host}:{port}'.format(host=host, port=server.server_address[1])
+
+    with server:
+        logger.info('Serving on {address} with {workers} workers'.format(address=address, workers=workers))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info('Shutting down')
+
+class RenderServer(socketserver.ThreadingMixIn, HTTPServer):
+    '''
+    HTTP server that handles each request in its own thread, but renders trees
+    on a bounded pool of worker processes.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address, workers, queue_size, graphviz_cache=None):
+        super().__init__(address, RenderHandler)
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.slots = BoundedSemaphore(workers + queue_size)
+        self.graphviz_cache = graphviz_cache
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+
+    # Python 3.5 servers are not context managers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+class UnixRenderServer(RenderServer):
+    '''
+    RenderServer listening on a Unix socket instead of a TCP port.
+    '''
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind assumes a (host, port) address
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+    def server_close(self):
+        # The socket file is left behind unless it is removed
+        try:
+            super().server_close()
+        finally:
+            try:
+                os.unlink(self.server_address)
+            except OSError:
+                pass
+
+class RenderHandler(BaseHTTPRequestHandler):
+
+    server_version = 'snutree'
+
+    def do_POST(self):
+
+        if self.path != '/render':
+            self.send_error(404)
+            return
+
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self.send_error(411)
+            return
+        body = self.rfile.read(length)
+
+        # Turn the request away if too many are already waiting for workers
+        if not self.server.slots.acquire(blocking=False):
+            self.send_error(503, 'Too many requests are waiting')
+            return
+
+        try:
+            future = self.server.executor.submit(render_request, body, self.server.graphviz_cache)
+            status, content_type, output = future.result()
+        except Exception: # pylint: disable=broad-except
+            logging.getLogger(logger_name).error('Unexpected error.', exc_info=True)
+            self.send_error(500)
+            return
+        finally:
+            self.server.slots.release()
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        logging.getLogger(logger_name).info(format % args)
+
+###############################################################################
+###############################################################################
+#### Rendering                                                             ####
+###############################################################################
+###############################################################################
+
+# Content types of the possible outputs
+CONTENT_TYPES = {
+    'dot' : 'text/vnd.graphviz; charset=utf-8',
+    'svg' : 'image/svg+xml',
+    'pdf' : 'application/pdf',
+    'eps' : 'application/postscript',
+    'txt' : 'text/plain; charset=utf-8',
+    'csv' : 'text/csv; charset=utf-8',
+}
+
+REQUEST_SCHEMA = {
+    'members' : {
+        'description' : 'the member table, as a list of member dictionaries',
+        'type' : 'list',
+        'required' : True,
+        },
+    'config' : {
+        'description' : 'configuration, as in a configuration file',
+        'type' : 'dict',
+        'default' : {},
+        },
+    'format' : {
+        'description' : 'output filetype',
+        'type' : 'string',
+        'allowed' : list(CONTENT_TYPES),
+        'default' : 'dot',
+        },
+    'schema' : {
+        'description' : 'built-in member table schema',
+        'type' : 'string',
+        'nullable' : True,
+        'default' : None,
+        },
+    'writer' : {
+        'description' : 'built-in writer module',
+        'type' : 'string',
+        'nullable' : True,
+        'default' : None,
+        },
+    'seed' : {
+        'description' : 'random number generator seed',
+        'type' : 'integer',
+        'nullable' : True,
+        'default' : None,
+        },
+    }
+
+REQUEST_VALIDATOR = Validator(REQUEST_SCHEMA)
+
+def render_request(body, graphviz_cache=None):
+    '''
+    Render the tree described by the JSON request body. Returns the HTTP
+    status, content type, and body of the response. Runs in a worker process,
+    so the modules and caches it uses stay loaded between requests.
+    '''
+
+    try:
+        request = parse_request(body)
+        # Copied, since validated defaults are shared between requests
+        config = dict(request['config'])
+        if isinstance(config.get('writer', {}), dict):
+            config['writer'] = dict(config.get('writer', {}), cache=graphviz_cache)
+        reader = api.get_reader_module('json')
+        member_table = reader.get_table(io.BytesIO(json.dumps(request['members']).encode('utf-8')))
+        output = api.render(member_table, config,
+                            schema=request['schema'],
+                            writer=request['writer'],
+                            output_format=request['format'],
+                            seed=request['seed'])
+    except SnutreeError as e:
+        return 400, 'text/plain; charset=utf-8', bytes(str(e), encoding='utf-8')
+
+    return 200, CONTENT_TYPES[request['format']], output
+
+def parse_request(body):
+    '''
+    Parse and validate the JSON request body. Requests may not name custom
+    modules or files on the server (only built-in schemas and writers may be
+    used, and output can only be returned, not written), and may not start
+    worker processes beyond the server's own.
+    '''
+
+    try:
+        request = json.loads(body.decode('utf-8'))
+    except ValueError as e:
+        msg = 'request must be valid JSON:\n{e}'.format(e=e)
+        raise SnutreeError(msg)
+    if not isinstance(request, dict):
+        msg = 'request must be a JSON object, not a {type}'.format(type=type(request).__name__)
+        raise SnutreeError(msg)
+    request = REQUEST_VALIDATOR.validated(request)
+
+    # Malformed sections are left for the configuration validator to report
+    section = lambda key: request['config'].get(key) if isinstance(request['config'].get(key), dict) else {}
+    schema = request['schema'] or section('schema').get('name')
+    writer = request['writer'] or section('writer').get('name')
+    if schema is not None and schema not in api.BUILTIN_SCHEMAS:
+        msg = 'schema must be one of {schemas!r}'.format(schemas=api.BUILTIN_SCHEMAS)
+        raise SnutreeError(msg)
+    if writer is not None and writer not in api.BUILTIN_WRITERS:
+        msg = 'writer must be one of {writers!r}'.format(writers=api.BUILTIN_WRITERS)
+        raise SnutreeError(msg)
+    # Requests may not write files or start processes of their own
+    forbidden = [('writer', 'file'), ('writer', 'outputs'), ('writer', 'cache'), ('schema', 'workers')]
+    for name, key in forbidden:
+        if section(name).get(key):
+            msg = '{name} option {key!r} cannot be used in requests'.format(name=name, key=key)
+            raise SnutreeError(msg)
+
+    return request
@@ -1,9 +1,9 @@
 import random
+from array import array
 from enum import Enum
-from collections import Iterable
+from operator import index, itemgetter
+from collections import Iterable, MutableMapping
 from abc import ABCMeta, abstractmethod
-from networkx import DiGraph
-from networkx.algorithms.components import weakly_connected_components
 from .errors import SnutreeError
 from .utilities.logging import logged
 
@@ -69,19 +69,36 @@ class Member(TreeEntity, metaclass=ABCMeta):
 class FamilyTree:
     '''
     Representation of the family tree. Each key is a string and each node is a
-    dictionary containing 'entity', which stores a TreeEntity for the
-    corresponding key. TreeEntities may also be Members.
+    dictionary-like TreeNode containing 'entity', which stores a TreeEntity for
+    the corresponding key. TreeEntities may also be Members.
 
     The edges between Members are the big-little relationships. These are
     created from the parent fields when Members are loaded into the tree.
     Non-Members may have edges, but these do not represent big-little
     relationships.
+
+    Internally, each key is interned to an integer node ID. Entities, ranks,
+    extra node attributes, and degrees are stored in flat lists and arrays
+    indexed by node ID, and the edges are stored in a single dictionary keyed
+    by (parent ID, child ID) pairs. Removing a node leaves a hole in the
+    lists; node IDs are never reused.
     '''
 
     @logged
     def __init__(self, members, seed=0):
-        self.graph = DiGraph()
         self.seed = seed
+        self._ids = {} # Key => node ID
+        self._keys = [] # Node ID => key
+        self._entities = [] # Node ID => TreeEntity (None if removed)
+        self._ranks = [] # Node ID => rank (None if unranked or removed)
+        self._rank_values = array('q') # Node ID => integer value of rank (0 if unranked or removed)
+        self._unranked = set() # IDs of nodes without ranks
+        self._attributes = [] # Node ID => dict of other attributes (or None)
+        self._in_degrees = array('L') # Node ID => number of parents
+        self._out_degrees = array('L') # Node ID => number of children
+        self._edges = {} # (Parent ID, child ID) => edge attribute dictionary
+        self._families = DisjointSets() # Node IDs, joined by member relationships
+        self._components = None # Cached connected component index
         self.add_members(members)
 
     ###########################################################################
@@ -129,6 +146,7 @@ class FamilyTree:
             raise TreeError(code, msg)
 
         self.add_edge(pkey, ckey)
+        self._families.union(self._ids[pkey], self._ids[ckey])
 
     def mark_families(self):
         '''
@@ -137,15 +155,17 @@ class FamilyTree:
         family.
         '''
 
-        # Families are weakly connected components of the members-only graph
-        members_only = self.member_subgraph()
-        families = weakly_connected_components(members_only)
-
-        # Add a pointer to each member's family subgraph
-        for family in families:
-            family_dict = {}
-            for key in family:
-                self[key]['family'] = family_dict
+        # Families are weakly connected components of the members-only graph.
+        # They are already tracked by the union-find structure, which joins a
+        # member's set with its parent's in add_member_relationship.
+        families = {}
+        for node_id in self._node_ids():
+            if isinstance(self._entities[node_id], Member):
+                root = self._families.find(node_id)
+                family_dict = families.get(root)
+                if family_dict is None:
+                    family_dict = families[root] = {}
+                self._node_attributes(node_id)['family'] = family_dict
 
     ###########################################################################
     #### Entities                                                          ####
@@ -168,70 +188,145 @@ class FamilyTree:
             code = TreeErrorCode.DUPLICATE_ENTITY
             msg = 'duplicate entity key: {key!r}'.format(key=key)
             raise TreeError(code, msg)
-        self.graph.add_node(key, entity=entity, **attributes)
+        self._ids[key] = len(self._keys)
+        self._keys.append(key)
+        self._entities.append(entity)
+        self._add_rank(entity)
+        self._attributes.append(attributes or None)
+        self._in_degrees.append(0)
+        self._out_degrees.append(0)
+        self._families.add()
+        self._components = None
+
+    def _add_rank(self, entity):
+        '''
+        Record the rank of the newly added entity. Ranks are usually integers
+        (Semesters are integers too), in which case their integer values are
+        also kept in an array, so bounds and groupings can be computed without
+        going through each entity. Otherwise, the array is dropped.
+        '''
+        node_id = len(self._ranks)
+        if not entity.is_ranked():
+            self._ranks.append(None)
+            self._unranked.add(node_id)
+            rank_value = 0
+        else:
+            rank = entity.rank
+            self._ranks.append(rank)
+            try:
+                rank_value = index(rank)
+            except TypeError:
+                self._rank_values = None
+        if self._rank_values is not None:
+            self._rank_values.append(rank_value)
+
+    def _check_ranked(self):
+        '''
+        Raise the appropriate TreeError for the first node that has no rank,
+        if there is one.
+        '''
+        if self._unranked:
+            self._entities[min(self._unranked)].rank # pylint: disable=expression-not-assigned
 
     def get_rank_bounds(self):
         '''
         Find and return the values of the highest and lowest ranks in use.
         '''
-        min_rank, max_rank = float('inf'), float('-inf')
-        for entity in self._iter('entity', keys=False):
-            rank = entity.rank
-            if rank and min_rank > rank:
-                min_rank = rank
-            if rank and max_rank < rank:
-                max_rank = rank
-        return min_rank, max_rank
+
+        self._check_ranked()
+
+        if not self._ids:
+            return float('inf'), float('-inf')
+
+        values = self._rank_values
+        if values is None:
+            ranks = [rank for rank in self._ranks if rank is not None]
+            return min(ranks), max(ranks)
+
+        # Zero marks removed nodes, which are skipped (ranks are never falsy)
+        ranked_values = list(filter(None, values))
+        min_value, max_value = min(ranked_values), max(ranked_values)
+        return self._ranks[values.index(min_value)], self._ranks[values.index(max_value)]
+
+    def keys_by_rank(self, min_rank, max_rank):
+        '''
+        Return a list with one list of keys for each rank from min_rank to
+        max_rank, excluding max_rank. Each list contains the keys of the nodes
+        with that rank, in the order they were added.
+        '''
+
+        self._check_ranked()
+
+        if not self._ids:
+            return []
+
+        # Ranks are not necessarily true integers, but differences between
+        # them are
+        groups = [[] for _ in range(max_rank - min_rank)]
+
+        values = self._rank_values
+        if values is None:
+            for node_id, rank in enumerate(self._ranks):
+                if rank is not None:
+                    groups[rank - min_rank].append(self._keys[node_id])
+            return groups
+
+        offset = index(min_rank)
+        keys = self._keys
+        for node_id, value in enumerate(values):
+            if value:
+                groups[value - offset].append(keys[node_id])
+        return groups
 
     ###########################################################################
     #### Iterators                                                         ####
     ###########################################################################
 
-    def _iter(self, *attributes, keys=True, nodes=False):
+    def _node_ids(self):
         '''
-        Iterates of the nodes of the graph, yielding tuples of the form:
-
-            (<KEY>, <ATTRIBUTE0>, <ATTRIBUATE1>, ..., <NODE>)
-
-        By default, returns only the keys. Setting keys=False will remove the
-        keys, setting any kwargs to some attribute name will include those
-        attributes (in the order they are written), and setting nodes=True will
-        include the entire node attribute dictionary at the end.
+        Yields the IDs of all nodes in the tree, in the order they were added.
+        '''
+        for node_id, entity in enumerate(self._entities):
+            if entity is not None:
+                yield node_id
 
-        If only one element will be in the yielded tuples, that element will
-        be yielded directly (i.e., not as a singleton tuple).
+    def _node_attributes(self, node_id):
         '''
-        for key, node in self.graph.nodes_iter(data=True):
-            yielded = (
-                *((key,) if keys else ()),
-                *tuple([node[attr] for attr in attributes]),
-                *((node,) if nodes else ())
-            )
-            yield yielded[0] if len(yielded) == 1 else yielded
+        Returns the extra attribute dictionary of the node with the given ID,
+        creating it first if the node does not have one yet.
+        '''
+        attributes = self._attributes[node_id]
+        if attributes is None:
+            attributes = self._attributes[node_id] = {}
+        return attributes
 
     def keys(self):
         '''
         Yields all the keys in the tree.
         '''
-        yield from self._iter()
+        for node_id in self._node_ids():
+            yield self._keys[node_id]
 
     def nodes(self):
         '''
         Yields all the nodes in the tree.
         '''
-        yield from self._iter(keys=False, nodes=True)
+        for node_id in self._node_ids():
+            yield TreeNode(self, node_id)
 
     def items(self):
         '''
         Yields all tree's keys and their nodes.
         '''
-        yield from self._iter(nodes=True)
+        for node_id in self._node_ids():
+            yield self._keys[node_id], TreeNode(self, node_id)
 
     def members(self):
         '''
         Yields all the Member objects in the tree's nodes.
         '''
-        for entity in self._iter('entity', keys=False):
+        for node_id in self._node_ids():
+            entity = self._entities[node_id]
             if isinstance(entity, Member):
                 yield entity
 
@@ -239,33 +334,33 @@ class FamilyTree:
         '''
         Yields all Members in the tree that have no parent nodes.
         '''
-        for key, in_degree in self.graph.in_degree().items():
-            entity = self[key]['entity']
-            if in_degree == 0 and isinstance(entity, Member):
+        for node_id in self._node_ids():
+            entity = self._entities[node_id]
+            if self._in_degrees[node_id] == 0 and isinstance(entity, Member):
                 yield entity
 
     def singletons(self):
         '''
         Yields all Members that neither have parent nodes nor child nodes.
         '''
-        for key, degree in self.graph.degree_iter():
-            entity = self[key]['entity']
+        for node_id in self._node_ids():
+            entity = self._entities[node_id]
+            degree = self._in_degrees[node_id] + self._out_degrees[node_id]
             if degree == 0 and isinstance(entity, Member):
                 yield entity
 
-    def edges(self):
+    def out_degrees(self):
         '''
-        Yields all the edge dictionaries in the tree.
+        Yields each key in the tree along with its number of child nodes.
         '''
-        for _, _, edge in self.graph.edges_iter(data=True):
-            yield edge
+        for node_id in self._node_ids():
+            yield self._keys[node_id], self._out_degrees[node_id]
 
-    def member_subgraph(self):
+    def edges(self):
         '''
-        Returns a subgraph consisting only of members.
+        Yields all the edge dictionaries in the tree.
         '''
-        member_keys = (member.key for member in self.members())
-        return self.graph.subgraph(member_keys)
+        yield from self._edges.values()
 
     ###########################################################################
     #### Ordered Iterators                                                 ####
@@ -296,14 +391,46 @@ class FamilyTree:
         Second: The keys and node dictionaries for all of the nodes in all of
         the components are then returned in lexicographical order.
         '''
-        components = weakly_connected_components(self.graph)
-        components = sorted(components, key=lambda component: min(component, key=str))
+        components = list(self._component_index())
         rng = random.Random(self.seed)
         rng.shuffle(components)
-        for component in components:
-            for key in sorted(component, key=str):
+        for _, keys in components:
+            for key in keys:
                 yield key, self[key]
 
+    def _component_index(self):
+        '''
+        Returns a list of the (weakly) connected components of the graph. Each
+        component is a pair containing a sort key (the string form of the
+        component's lexicographically-minimum key) and a list of the keys in
+        the component, sorted by their string forms. The list itself is sorted
+        by the components' sort keys.
+
+        The index is cached, and is only rebuilt after nodes or edges have been
+        added or removed.
+        '''
+
+        if self._components is not None:
+            return self._components
+
+        sets = DisjointSets(len(self._keys))
+        for pid, cid in self._edges:
+            sets.union(pid, cid)
+
+        by_root = {}
+        for node_id in self._node_ids():
+            by_root.setdefault(sets.find(node_id), []).append(node_id)
+
+        # Stringify each key only once, for all the sorting that follows
+        components = []
+        for component in by_root.values():
+            decorated = sorted(((str(self._keys[i]), self._keys[i]) for i in component), key=itemgetter(0))
+            components.append((decorated[0][0], [key for _, key in decorated]))
+        components.sort(key=itemgetter(0))
+
+        self._components = components
+        return components
+
     def ordered_edges(self):
         '''
         Yields this graph's edges in a guaranteed consistent order. Each result
@@ -312,7 +439,8 @@ class FamilyTree:
         parent key, then child key, then the string form of the edge's
         attribute dictionary.
         '''
-        edges = self.graph.edges(data=True)
+        keys = self._keys
+        edges = [(keys[pid], keys[cid], edge) for (pid, cid), edge in self._edges.items()]
         def sort_key(arg):
             parent_key, child_key, edge_dict = arg
             return (parent_key, child_key, str(edge_dict))
@@ -323,22 +451,146 @@ class FamilyTree:
     ###########################################################################
 
     def add_edges(self, edges, **attributes):
-        self.graph.add_edges_from(edges, **attributes)
+        for pkey, ckey in edges:
+            self.add_edge(pkey, ckey, **attributes)
 
-    def add_edge(self, key, pkey, **attributes):
-        self.graph.add_edge(key, pkey, **attributes)
+    def add_edge(self, pkey, ckey, **attributes):
+        '''
+        Add an edge from the parent key to the child key, updating the edge's
+        attributes if it already exists. Both keys must already be in the tree.
+        '''
+        pid, cid = self._ids[pkey], self._ids[ckey]
+        edge = self._edges.get((pid, cid))
+        if edge is None:
+            edge = self._edges[pid, cid] = {}
+            self._out_degrees[pid] += 1
+            self._in_degrees[cid] += 1
+            self._components = None
+        edge.update(attributes)
 
     def remove(self, key_or_keys):
         if isinstance(key_or_keys, Iterable):
-            self.graph.remove_nodes_from(key_or_keys)
+            removed = {self._ids.pop(key) for key in key_or_keys if key in self._ids}
         else:
-            self.graph.remove_node(key_or_keys)
+            removed = {self._ids.pop(key_or_keys)}
+
+        for node_id in removed:
+            self._entities[node_id] = None
+            self._ranks[node_id] = None
+            self._unranked.discard(node_id)
+            if self._rank_values is not None:
+                self._rank_values[node_id] = 0
+            self._attributes[node_id] = None
+
+        if removed:
+            self._components = None
+            doomed = [edge for edge in self._edges if edge[0] in removed or edge[1] in removed]
+            for pid, cid in doomed:
+                del self._edges[pid, cid]
+                self._out_degrees[pid] -= 1
+                self._in_degrees[cid] -= 1
+
+    def __len__(self):
+        return len(self._ids)
+
+    def number_of_edges(self):
+        return len(self._edges)
 
     def __contains__(self, key):
-        return key in self.graph
+        return key in self._ids
 
     def __getitem__(self, key):
-        return self.graph.node[key]
+        return TreeNode(self, self._ids[key])
+
+class TreeNode(MutableMapping):
+    '''
+    A dictionary-like view of a single node in a FamilyTree. The 'entity' key
+    refers to the node's TreeEntity, which is stored in the tree itself. All
+    other keys are stored in a per-node dictionary, which is only created once
+    the node is given its first such attribute.
+    '''
+
+    # pylint: disable=protected-access
+
+    __slots__ = ('tree', 'node_id')
+
+    def __init__(self, tree, node_id):
+        self.tree = tree
+        self.node_id = node_id
+
+    def __getitem__(self, name):
+        if name == 'entity':
+            return self.tree._entities[self.node_id]
+        attributes = self.tree._attributes[self.node_id]
+        if attributes is None:
+            raise KeyError(name)
+        return attributes[name]
+
+    def __setitem__(self, name, value):
+        if name == 'entity':
+            msg = 'the entity of a tree node cannot be replaced'
+            raise KeyError(msg)
+        self.tree._node_attributes(self.node_id)[name] = value
+
+    def __delitem__(self, name):
+        if name == 'entity':
+            msg = 'the entity of a tree node cannot be deleted'
+            raise KeyError(msg)
+        attributes = self.tree._attributes[self.node_id]
+        if attributes is None:
+            raise KeyError(name)
+        del attributes[name]
+
+    def __iter__(self):
+        yield 'entity'
+        yield from self.tree._attributes[self.node_id] or ()
+
+    def __len__(self):
+        return 1 + len(self.tree._attributes[self.node_id] or ())
+
+class DisjointSets:
+    '''
+    Union-find structure over the integers 0, 1, 2, and so on, which start out
+    as singletons (`size` of them at first, plus one per call to add). Parent
+    pointers and set sizes are kept in flat arrays; sets are merged by size
+    and paths are halved on every lookup, so operations take nearly constant
+    amortized time.
+    '''
+
+    def __init__(self, size=0):
+        self.parents = array('L', range(size))
+        self.sizes = array('L', [1]) * size
+
+    def add(self):
+        '''
+        Add a new singleton set and return its element.
+        '''
+        element = len(self.parents)
+        self.parents.append(element)
+        self.sizes.append(1)
+        return element
+
+    def find(self, element):
+        '''
+        Return the representative element of the set containing element.
+        '''
+        parents = self.parents
+        while parents[element] != element:
+            parents[element] = element = parents[parents[element]]
+        return element
+
+    def union(self, element1, element2):
+        '''
+        Merge the sets containing the two elements and return the
+        representative element of the merged set.
+        '''
+        root1, root2 = self.find(element1), self.find(element2)
+        if root1 != root2:
+            if self.sizes[root1] < self.sizes[root2]:
+                root1, root2 = root2, root1
+            self.parents[root2] = root1
+            self.sizes[root1] += self.sizes[root2]
+        return root1
 
 ###############################################################################
 ###############################################################################
@@ -4,6 +4,7 @@ Tools used to print the tree to DOT code.
 
 from abc import ABCMeta
 from collections import namedtuple
+from functools import lru_cache
 from snutree.utilities.indent import Indent
 
 class DotCommon(metaclass=ABCMeta):
@@ -13,9 +14,18 @@ class DotCommon(metaclass=ABCMeta):
         self.attributes = attributes.copy() if attributes else {}
 
     def to_dot(self, indent=None):
+        return ''.join(self.iter_dot(indent))
+
+    def iter_dot(self, indent=None):
+        '''
+        Yields the DOT code for this object in chunks of (typically) one line
+        each, so large graphs can be written out without ever holding all of
+        their DOT code in memory.
+        '''
         indent = indent or Indent()
         self_dot = str(self)
-        return '{indent}{self_dot}\n'.format(indent=indent, self_dot=self_dot) if self_dot else ''
+        if self_dot:
+            yield '{indent}{self_dot}\n'.format(indent=indent, self_dot=self_dot)
 
     def attributes_to_dot(self, sep=','):
         '''
@@ -24,15 +34,22 @@ class DotCommon(metaclass=ABCMeta):
         key and value, to ensure consistency when compiling (i.e., to make the
         result code more diffable).
         '''
-
-        attributes = []
-        for key, value in sorted(self.attributes.items()):
-            # If the value is a string bracketed by '<' and '>', use those instead
-            bracketed = isinstance(value, str) and len(value) > 1 and value[0::len(value)-1] == '<>'
-            kv_pair = '{key}="{value}"'.format(key=key, value=value) if not bracketed else '{key}={value}'.format(key=key, value=value)
-            attributes.append(kv_pair)
-
-        return sep.join(attributes)
+        # Attributes are formatted one at a time, since whole attribute lists
+        # are rarely repeated (e.g., every member node has its own label)
+        items = sorted(self.attributes.items())
+        try:
+            return sep.join([attribute(key, value) for key, value in items])
+        except TypeError: # Unhashable values
+            return sep.join([attribute.__wrapped__(key, value) for key, value in items])
+
+@lru_cache(maxsize=2**12, typed=True)
+def attribute(key, value):
+    '''
+    Form a single DOT attribute. If the value is a string bracketed by '<' and
+    '>' (i.e., an HTML-like label), those are used instead of quotation marks.
+    '''
+    bracketed = isinstance(value, str) and len(value) > 1 and value[0::len(value)-1] == '<>'
+    return '{key}="{value}"'.format(key=key, value=value) if not bracketed else '{key}={value}'.format(key=key, value=value)
 
 class Graph(DotCommon):
 
@@ -48,23 +65,18 @@ class Graph(DotCommon):
         self.children = children or []
         super().__init__(key, attributes)
 
-    def to_dot(self, indent=None):
+    def iter_dot(self, indent=None):
 
-        lines = []
         indent = indent or Indent()
 
-        lines.append('{indent}{graph_type} "{key}" {{\n'.format(indent=indent, graph_type=self.graph_type, key=self.key))
+        yield '{indent}{graph_type} "{key}" {{\n'.format(indent=indent, graph_type=self.graph_type, key=self.key)
         with indent.indented():
             if self.attributes:
                 attributes = self.attributes_to_dot(sep=';\n{indent}'.format(indent=indent))
-                lines.append('{indent}{attributes};\n'.format(indent=indent, attributes=attributes))
+                yield '{indent}{attributes};\n'.format(indent=indent, attributes=attributes)
             for child in self.children:
-                line = child.to_dot(indent)
-                if line: # some children might represent empty strings
-                    lines.append(line)
-        lines.append('{indent}}}\n'.format(indent=indent))
-
-        return ''.join(lines)
+                yield from child.iter_dot(indent)
+        yield '{indent}}}\n'.format(indent=indent)
 
 class Defaults(DotCommon):
 
@@ -0,0 +1,164 @@
+'''
+A content-addressed cache of files on disk, bounded in size, along with the
+atomic file writes it (and the other caches of snutree) is saved with.
+'''
+
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import mkstemp
+
+@contextmanager
+def atomic_writer(path, mode='wb', ignore_errors=False):
+    '''
+    Context manager providing a file to write the new contents of the file at
+    the path to. The file is only replaced, atomically, once the block exits
+    without an exception, so an interrupted write never leaves a partial file
+    behind. If ignore_errors is True, failures to write (i.e., OSErrors) are
+    ignored and whatever was written is discarded; this suits files that only
+    serve as optimizations.
+    '''
+
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, partial_name = mkstemp(suffix='.partial', dir=str(path.parent))
+    except OSError:
+        if not ignore_errors:
+            raise
+        with open(os.devnull, mode) as f:
+            yield f
+        return
+
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(partial_name, str(path))
+    except OSError:
+        discard(partial_name)
+        if not ignore_errors:
+            raise
+    except BaseException:
+        discard(partial_name)
+        raise
+
+def discard(name):
+    '''
+    Removes the file with the given name, if it can.
+    '''
+    try:
+        os.remove(name)
+    except OSError:
+        pass
+
+class FileCache:
+    '''
+    Stores binary blobs as files in a directory, each named after a key (see
+    FileCache.key). Reading an entry marks it as recently used by updating its
+    modification time. Whenever an entry is added, the least recently used
+    entries are deleted until the directory holds at most max_size bytes.
+    '''
+
+    suffix = '.cache'
+
+    def __init__(self, directory, max_size):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    @staticmethod
+    def key(*parts):
+        '''
+        Returns a key for an entry identified by the given parts, which may be
+        strings, bytes, or iterators over chunks of bytes (so that large parts
+        never need to be held in memory in full).
+        '''
+        sha = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, (str, bytes)):
+                part = part if isinstance(part, bytes) else bytes(part, encoding='utf-8')
+                # Length-prefix each part so that different splits do not collide
+                sha.update(bytes(str(len(part)), encoding='ascii') + b':' + part)
+            else:
+                # Parts of unknown length are hashed on their own first
+                part_sha = hashlib.sha256()
+                for chunk in part:
+                    part_sha.update(chunk)
+                sha.update(b'*' + part_sha.digest())
+        return sha.hexdigest()
+
+    def path(self, key):
+        return self.directory/(key + self.suffix)
+
+    def open(self, key):
+        '''
+        Returns the blob stored under the key as a binary file open for
+        reading, or None if there is none.
+        '''
+        path = self.path(key)
+        try:
+            f = path.open('rb')
+        except OSError:
+            return None
+        try:
+            os.utime(str(path))
+        except OSError:
+            pass
+        return f
+
+    def get(self, key):
+        '''
+        Returns the blob stored under the key, or None if there is none.
+        '''
+        f = self.open(key)
+        if f is None:
+            return None
+        with f:
+            try:
+                return f.read()
+            except OSError:
+                return None
+
+    @contextmanager
+    def writer(self, key):
+        '''
+        Context manager providing a binary file to write a new blob to. The
+        blob is only stored under the key, and old entries evicted as needed,
+        once the block exits without an exception. The cache is only an
+        optimization, so failures to write are ignored.
+        '''
+        with atomic_writer(self.path(key), ignore_errors=True) as f:
+            yield f
+        self.evict()
+
+    def put(self, key, data):
+        '''
+        Stores the blob under the key, then evicts old entries as needed. The
+        cache is only an optimization, so failures to write are ignored.
+        '''
+        with self.writer(key) as f:
+            f.write(data)
+
+    def evict(self):
+        '''
+        Deletes the least recently used entries until the total size of the
+        remaining entries is at most max_size.
+        '''
+
+        entries = []
+        for path in self.directory.glob('*' + self.suffix):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total_size <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total_size -= size
@@ -0,0 +1,23 @@
+'''
+Tables of interned objects, so that equal objects made from many rows of the
+same input (e.g., semesters and chapter affiliations) are only created once.
+'''
+
+class InternTable(dict):
+    '''
+    Dictionary of interned objects that stops growing once it holds max_size
+    of them, so that unusual inputs cannot grow it forever. Objects added past
+    that size are simply not interned.
+    '''
+
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+
+    def add(self, key, value):
+        '''
+        Stores the value under the key if there is room, and returns it.
+        '''
+        if len(self) < self.max_size:
+            self[key] = value
+        return value
@@ -1,7 +1,6 @@
 import sys
 import logging
 import time
-import inspect
 from functools import wraps
 from ..errors import SnutreeError
 
@@ -60,7 +59,7 @@ def logged(function):
     function every time it is called.
     '''
 
-    logger = logging.getLogger(inspect.getmodule(function).__name__)
+    logger = logging.getLogger(function.__module__)
 
     @wraps(function)
     def wrapped(*args, **kwargs):
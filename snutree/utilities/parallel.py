@@ -0,0 +1,57 @@
+'''
+Tools for letting schema modules spread work over several processes.
+'''
+
+import io
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+def map_chunks(schema, schema_name, function_name, args, items, workers, chunk_size=1000):
+    '''
+    Split the items into chunks of chunk_size and call the schema module
+    function with the given name on each chunk, as `function(chunk, *args)`, in
+    a pool of worker processes. Yields the results for each chunk in the
+    original order of the chunks.
+
+    Schema modules are loaded under a different name in every process, so the
+    workers load the schema module themselves using its schema name, and
+    results are passed back using the build cache's pickler (which pickles
+    classes of the schema module by name). Only a few chunks at a time are
+    handed out ahead of the ones being yielded, so that items are read no
+    faster than they are needed.
+    '''
+
+    # Imported here to avoid a circular import
+    from snutree.cache import SchemaUnpickler
+
+    items = iter(items)
+    chunks = iter(lambda: list(islice(items, chunk_size)), [])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        submit = lambda chunk: executor.submit(run_chunk, schema_name, function_name, args, chunk)
+        pending = deque(submit(chunk) for chunk in islice(chunks, 2 * workers))
+
+        while pending:
+            pickled = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(submit(chunk))
+            yield SchemaUnpickler(io.BytesIO(pickled), schema).load()
+
+def run_chunk(schema_name, function_name, args, chunk):
+    '''
+    Call the function with the given name, from the schema module with the
+    given schema name, on the chunk and the other arguments. Returns the
+    pickled result. Runs in a worker process of map_chunks.
+    '''
+
+    from snutree import api
+    from snutree.cache import SchemaPickler
+
+    schema = api.get_schema_module(schema_name)
+    result = getattr(schema, function_name)(chunk, *args)
+
+    f = io.BytesIO()
+    SchemaPickler(f, schema).dump(result)
+    return f.getvalue()
@@ -0,0 +1,21 @@
+'''
+Finds snutree's built-in plugins without importing them (or pluginbase), so
+that the command-line interface can list them cheaply.
+'''
+
+import pkgutil
+import sys
+from pathlib import Path
+
+# The snutree package folder (used for importing member formats)
+SNUTREE_ROOT = Path(__file__).parent.parent \
+    if not getattr(sys, 'frozen', False) \
+    else Path(sys._MEIPASS) # pylint: disable=no-member,protected-access
+
+def get_builtin_plugins(subpackage):
+    '''
+    Returns a sorted list of the names of the built-in plugins in the snutree
+    subpackage whose name is a parameter.
+    '''
+    searchpath = [str(SNUTREE_ROOT/subpackage)]
+    return sorted(name for _, name, _ in pkgutil.iter_modules(searchpath))
@@ -1,4 +1,5 @@
 import re
+from snutree.utilities.interning import InternTable
 
 class Semester(int):
     '''
@@ -9,22 +10,32 @@ class Semester(int):
 
     matcher = re.compile(r'(Spring|Fall) (\d+)')
 
+    # Semesters are interned: each distinct semester is created once, and
+    # each distinct name is parsed once, after which the same Semester object
+    # is reused
+    CACHE_SIZE = 2**14
+    interned = InternTable(CACHE_SIZE) # Value => Semester
+    parsed = InternTable(CACHE_SIZE) # Name => Semester
+
     def __new__(cls, *arg):
 
+        if len(arg) == 1 and cls is Semester:
+            arg = arg[0]
+            if isinstance(arg, str):
+                semester = Semester.parsed.get(arg)
+                if semester is None:
+                    semester = Semester.parsed.add(arg, Semester.intern(Semester.parse(arg)))
+                return semester
+            elif isinstance(arg, int):
+                semester = Semester.interned.get(arg)
+                return semester if semester is not None else Semester.intern(arg)
+            arg = (arg,) # Invalid; rejected below
+
         if len(arg) == 1 and isinstance(arg[0], int):
             value = arg[0]
 
         elif len(arg) == 1 and isinstance(arg[0], str):
-
-            arg = arg[0]
-            match = Semester.matcher.match(arg)
-            if match:
-                season = 1 if match.group(1) == 'Fall' else 0
-                year = int(match.group(2))
-                value = 2 * year + season
-            else:
-                msg = 'semester names must match "{pattern}"'.format(pattern=Semester.matcher.pattern)
-                raise ValueError(msg)
+            value = cls.parse(arg[0])
 
         elif len(arg) == 2 and isinstance(arg[0], str) and isinstance(arg[1], int):
 
@@ -39,21 +50,54 @@ class Semester(int):
         else:
             raise TypeError('expected int, str, or *(str, int)')
 
-        return super(Semester, cls).__new__(cls, value)
+        return cls.intern(value) if cls is Semester else super(Semester, cls).__new__(cls, value)
+
+    @classmethod
+    def intern(cls, value):
+        '''
+        Returns the interned Semester with the given integer value, creating
+        it if there is none.
+        '''
+        semester = cls.interned.get(value)
+        if semester is None:
+            semester = cls.interned.add(value, super(Semester, cls).__new__(cls, value))
+        return semester
+
+    @classmethod
+    def parse(cls, name):
+        '''
+        Returns the integer value of the semester with the given name, such as
+        "Fall 1950".
+        '''
+        match = cls.matcher.match(name)
+        if match:
+            season = 1 if match.group(1) == 'Fall' else 0
+            year = int(match.group(2))
+            return 2 * year + season
+        else:
+            msg = 'semester names must match "{pattern}"'.format(pattern=cls.matcher.pattern)
+            raise ValueError(msg)
 
     def __repr__(self):
-        year, is_fall = divmod(self, 2)
-        season = 'Fall' if is_fall else 'Spring'
-        return '{season} {year}'.format(season=season, year=year)
+        # Names are saved, since the same (interned) semesters are printed often
+        name = self.__dict__.get('_name')
+        if name is None:
+            year, is_fall = divmod(self, 2)
+            season = 'Fall' if is_fall else 'Spring'
+            name = self.__dict__['_name'] = '{season} {year}'.format(season=season, year=year)
+        return name
 
     def __str__(self):
         return repr(self)
 
     def __add__(self, other):
-        return Semester(super(Semester, self).__add__(other))
+        value = int.__add__(self, other)
+        semester = Semester.interned.get(value)
+        return semester if semester is not None else Semester(value)
 
     __radd__ = __add__
 
     def __sub__(self, other):
-        return Semester(super(Semester, self).__sub__(other))
-
+        value = int.__sub__(self, other)
+        semester = Semester.interned.get(value)
+        return semester if semester is not None else Semester(value)
@@ -4,6 +4,9 @@ Additional functions for voluptuous-style validation.
 '''
 
 import re
+from voluptuous import Schema, Required, Optional, Exclusive, Inclusive, PREVENT_EXTRA
+from voluptuous.humanize import validate_with_humanized_errors
+from voluptuous.schema_builder import UNDEFINED
 
 DIGITS_MATCHER = re.compile(r'\d+')
 
@@ -25,3 +28,59 @@ def NonEmptyString(s):
         return s
     raise ValueError
 
+
+class CompiledSchema:
+    '''
+    A voluptuous dictionary schema compiled into a faster validator. Calling a
+    CompiledSchema on a dictionary validates it like calling
+    validate_with_humanized_errors on the dictionary and the original schema.
+
+    Voluptuous interprets its schemas anew for every dictionary it validates.
+    Instead, when the schema consists only of string keys (or Required or
+    Optional markers of string keys, without defaults) mapped to validator
+    functions, the key checks are done here with sets and the validators are
+    called directly. Whenever a dictionary is rejected, or a validator fails
+    in any way, the dictionary is validated again by voluptuous itself, so
+    that errors (and their humanized messages) are exactly the same. Schemas
+    that cannot be compiled are always validated by voluptuous.
+    '''
+
+    def __init__(self, schema):
+
+        self.schema = schema
+        self.validators = None
+
+        if not isinstance(schema.schema, dict) or schema.extra != PREVENT_EXTRA:
+            return
+
+        validators, required = {}, set()
+        for key, validator in schema.schema.items():
+            # Exclusive and Inclusive keys (Optional subclasses) are left to voluptuous
+            if isinstance(key, (Required, Optional)) and not isinstance(key, (Exclusive, Inclusive)) \
+                    and key.default is UNDEFINED:
+                if isinstance(key, Required):
+                    required.add(key.schema)
+                key = key.schema
+            elif schema.required:
+                required.add(key)
+            if not isinstance(key, str) or not callable(validator) \
+                    or isinstance(validator, (type, Schema)):
+                return
+            validators[key] = validator
+
+        self.validators = validators
+        self.required = frozenset(required)
+
+    def __call__(self, dct):
+
+        # Only exactly dict, since voluptuous returns a mapping of the same
+        # type as its input (e.g., an OrderedDict for an OrderedDict)
+        validators = self.validators
+        if (validators is not None and type(dct) is dict # pylint: disable=unidiomatic-typecheck
+                and self.required.issubset(dct) and validators.keys() >= dct.keys()):
+            try:
+                return {key : validators[key](value) for key, value in dct.items()}
+            except Exception: # pylint: disable=broad-except
+                pass
+
+        return validate_with_humanized_errors(dct, self.schema)
@@ -1,5 +1,11 @@
 import logging
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager
+from functools import lru_cache
+from itertools import chain
+from tempfile import TemporaryFile
+from threading import Lock, Thread
 from snutree.errors import SnutreeWriterError
 from snutree.tree import TreeEntity
 from snutree.tree import TreeError
@@ -7,9 +13,13 @@ from snutree.utilities import dot
 from snutree.utilities.cerberus import Validator
 from snutree.utilities.logging import logged
 from snutree.utilities.colors import ColorPicker
+from snutree.utilities.filecache import FileCache
 
 logger_name = 'snutree.writers.dot'
 
+# Size of the chunks read from Graphviz and from temporary files
+CHUNK_SIZE = 2**16
+
 ###############################################################################
 ###############################################################################
 #### API                                                                   ####
@@ -27,17 +37,35 @@ def compile_tree(tree, RankType, config):
 
     logger = logging.getLogger(logger_name)
 
-    validator = Validator(CONFIG_SCHEMA, RankType=RankType)
-    config = validator.validated(config)
+    config = get_validator(RankType).validated(config)
 
     logger.info('Converting to DOT format')
     decorate(tree, config)
     dot_graph = create_dot_graph(tree, config['ranks'], config['defaults'])
-    dot_source = dot_graph.to_dot()
 
-    filetype = config["filetype"]
-    logger.info('Compiling to {filetype}'.format(filetype=filetype))
-    output = compiled(dot_source, filetype)
+    cache = FileCache(config['cache'], config['cache_size'] * 2**20) if config['cache'] else None
+
+    # The main output is returned; any additional outputs are written here
+    paths = config['outputs']
+    output_filetypes = [config['filetype']] + [path.suffix[1:] for path in paths]
+    for path, filetype in zip(paths, output_filetypes[1:]):
+        if filetype not in filetypes:
+            msg = 'output {path!r} must have one of the extensions {filetypes!r}'.format(path=str(path), filetypes=sorted(filetypes))
+            raise SnutreeWriterError(msg)
+    logger.info('Compiling to {filetypes}'.format(filetypes=', '.join(output_filetypes)))
+    output, *outputs = compiled_all(dot_graph, output_filetypes, cache)
+
+    # Graphviz is already running for every output, so drain the additional
+    # outputs concurrently. If any of them fails, the main output will never
+    # be read, so every output is closed to stop its Graphviz process.
+    try:
+        if paths:
+            logger.info('Writing to {paths}'.format(paths=', '.join(str(path) for path in paths)))
+            with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+                list(executor.map(write_file, paths, outputs))
+    except BaseException:
+        close_all([output] + outputs)
+        raise
 
     return output
 
@@ -47,6 +75,15 @@ def compile_tree(tree, RankType, config):
 ###############################################################################
 ###############################################################################
 
+@lru_cache(maxsize=None)
+def get_validator(RankType):
+    '''
+    Returns the configuration validator for the given rank type. (Creating a
+    validator is slow, so they are reused when many trees are created by the
+    same process.)
+    '''
+    return Validator(CONFIG_SCHEMA, RankType=RankType)
+
 # Contains groups of attributes labeled by the strings in `allowed`
 attribute_defaults = lambda key, allowed: {
     'description' : 'defaults for Graphviz {key}s'.format(key=key),
@@ -85,6 +122,27 @@ CONFIG_SCHEMA = {
         'coerce' : 'optional_path',
         'nullable' : True,
     },
+    'outputs' : {
+        'description' : 'additional output files, compiled in parallel to the filetypes of their extensions',
+        'type' : 'list',
+        'default' : [],
+        'schema' : {
+            'description' : 'path',
+            'coerce' : 'optional_path',
+        },
+    },
+    'cache' : {
+        'description' : 'directory in which to cache compiled Graphviz output',
+        'coerce' : 'optional_path',
+        'default' : None,
+        'nullable' : True,
+    },
+    'cache_size' : {
+        'description' : 'maximum size of the compiled output cache, in MiB',
+        'type' : 'integer',
+        'min' : 0,
+        'default' : 256,
+    },
     'ranks' : {
         'description' : 'enable ranks',
         'type' : 'boolean',
@@ -478,8 +536,8 @@ def create_ranks(tree, min_rank, max_rank):
         ranks.append(dot.Rank(['{i}L'.format(i=i), '{i}R'.format(i=i)]))
         i += 1
 
-    for key, node in tree.items():
-        ranks[node['entity'].rank - min_rank].keys.append(key)
+    for rank, keys in zip(ranks, tree.keys_by_rank(min_rank, max_rank)):
+        rank.keys.extend(keys)
 
     return ranks
 
@@ -490,18 +548,145 @@ def create_ranks(tree, min_rank, max_rank):
 ###############################################################################
 
 @logged
-def compiled(src, filetype):
+def compiled_all(dot_graph, output_filetypes, cache=None):
+    '''
+    Compile the dot.Graph to each of the filetypes and return the results in
+    the same order, as iterators over chunks of bytes. The DOT source is
+    serialized only as it is consumed, either by the writer of a DOT output
+    or by the Graphviz process compiling another format.
+
+    Graphviz processes are started right away, so they all run concurrently;
+    each one blocks once its output pipe is full, until that output is read.
+    Outputs that will not be read to the end must be closed (see OutputChunks).
+
+    When there is more than one Graphviz filetype, the expensive layout step
+    only happens once: dot lays the graph out into xdot, which includes the
+    positions of all nodes and edges, and each filetype is then rendered from
+    that with `neato -n2`, which uses the existing positions instead of doing
+    a new layout. The laid-out graph is kept until every output is finished.
+    '''
+
+    source = lambda: compile_dot(dot_graph)
+
+    graphviz_filetypes = {filetype for filetype in output_filetypes if filetype != 'dot'}
+    if len(graphviz_filetypes) <= 1:
+        compile_one = lambda filetype: compile_fmt(source, filetype, cache)
+        return started_all(compile_one, source, output_filetypes)
+
+    with ExitStack() as stack:
+        positioned_source = stack.enter_context(layout(source, cache))
+        compile_one = lambda filetype: compile_fmt(positioned_source, filetype, cache, positioned=True)
+        outputs = started_all(compile_one, source, output_filetypes)
+        return closed_after(outputs, stack.pop_all())
+
+def started_all(compile_one, source, output_filetypes):
+    '''
+    Returns the DOT source for each 'dot' filetype and the result of
+    compile_one for each other filetype. If compile_one fails, the outputs
+    already started are closed before the error is raised.
+    '''
+    outputs = []
+    try:
+        for filetype in output_filetypes:
+            outputs.append(source() if filetype == 'dot' else compile_one(filetype))
+    except BaseException:
+        close_all(outputs)
+        raise
+    return outputs
+
+def closed_after(outputs, stack):
+    '''
+    Wraps each of the output iterators, so that the ExitStack is closed once
+    every one of them has finished or been closed (successfully or not).
+    '''
+
+    lock = Lock()
+    remaining = len(outputs)
+
+    def finisher(output):
+        finished = False
+        def finish():
+            nonlocal remaining, finished
+            with lock:
+                if finished:
+                    return
+                finished = True
+                remaining -= 1
+                done = not remaining
+            try:
+                output.close()
+            finally:
+                if done:
+                    stack.close()
+        return finish
+
+    def wrapped(output, finish):
+        try:
+            yield from output
+        finally:
+            finish()
+
+    finishers = [finisher(output) for output in outputs]
+    return [OutputChunks(wrapped(output, finish), finish) for output, finish in zip(outputs, finishers)]
+
+def close_all(outputs):
+    '''
+    Close each of the output iterators, even if closing one of them fails.
+    '''
+    with ExitStack() as stack:
+        for output in outputs:
+            stack.callback(output.close)
+
+class OutputChunks:
+    '''
+    Iterator over the chunks of an output, which calls `cleanup` when it is
+    closed. Unlike a generator's `finally` clause, the cleanup happens even if
+    the output was never iterated over at all, so a Graphviz process is not
+    left running when its output is discarded. The cleanup must be safe to
+    call more than once.
+    '''
+
+    def __init__(self, chunks, cleanup):
+        self.chunks = chunks
+        self.cleanup = cleanup
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        try:
+            self.chunks.close()
+        finally:
+            self.cleanup()
+
+@contextmanager
+def layout(source, cache=None):
     '''
-    If the filetype is DOT, return the raw DOT source code. Otherwise, use
-    Graphviz to do the compiling.
+    Uses Graphviz dot to lay out the DOT source, which is provided by the
+    zero-argument function `source` as an iterator over chunks of bytes. The
+    result is DOT source in the xdot format, which includes the positions of
+    every node and edge. It is kept in a temporary file until the context
+    exits, and the context provides a function returning iterators over its
+    chunks.
     '''
-    return compile_dot(src) if filetype == 'dot' else compile_fmt(src, filetype)
+    with TemporaryFile() as positioned, closing(run_graphviz(['dot', '-Txdot'], source, 'xdot', cache)) as chunks:
+        for chunk in chunks:
+            positioned.write(chunk)
+        positioned.flush()
+        yield FileChunks(positioned)
 
 @logged
-def compile_fmt(src, filetype):
+def compile_fmt(source, filetype, cache=None, positioned=False):
     '''
     Uses Graphviz dot to convert the DOT source into the appropriate filetype.
-    Returns the binary of that filetype.
+    The source is provided by the zero-argument function `source` as an
+    iterator over chunks of bytes. Returns an iterator over chunks of the
+    binary of that filetype. If positioned is True, the source must already be
+    laid out (see the layout function), and it is rendered with `neato -n2`
+    without being laid out again.
 
     Note: Although Graphviz supports many formats, only a handful of them are
     permissible here. If you want to use those formats, pipe the DOT output of
@@ -511,32 +696,181 @@ def compile_fmt(src, filetype):
     # This should have been checked somewhere outside this function, but who knows?
     assert filetype in filetypes, 'filetype not properly cleaned'
 
-    try:
+    option = '-T{filetype}'.format(filetype=filetype)
+    args = ['neato', '-n2', option] if positioned else ['dot', option]
+    return run_graphviz(args, source, filetype, cache)
 
-        # `shell=True` is necessary for Windows, but not for Linux. The command
-        # string is constant except for the validated {filetype}, so shell=True
-        # should be fine
-        result = subprocess.run(
-            'dot -T{filetype}'.format(filetype=filetype), check=True, shell=True,
-            # The input will be a str and the output will be binary, but
-            # subprocess.run requires they both be str or both be binary.
-            # So, use binary and send the source in as binary (encoded
-            # appropriately).
-            input=bytes(src, encoding='utf-8'),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE # Windows doesn't like it when stderr is left alone
-        )
-    except (OSError, subprocess.CalledProcessError) as exception:
-        msg = 'had a problem compiling to {filetype}:\n{exception}\nCaptured Standard Error:\n{stderr}'.format(filetype=filetype, exception=exception, stderr=exception.stderr)
+def run_graphviz(args, source, filetype, cache=None):
+    '''
+    Starts the Graphviz command given by args, and returns an iterator over
+    chunks of its output. The DOT source, provided by the zero-argument
+    function `source` as an iterator over chunks of bytes, is fed to the
+    command's standard input from another thread while the output is being
+    read, so neither ever needs to be held in memory in full. (The filetype is
+    used in messages.)
+
+    If a FileCache is provided, output is stored in it, keyed by the DOT
+    source, the command, and the Graphviz version. Output found in the cache
+    is read back without running Graphviz at all. (Computing the key requires
+    serializing the source an extra time.)
+    '''
+
+    key = None
+    if cache is not None:
+        key = FileCache.key(' '.join(args), graphviz_version(), source())
+        cached = cache.open(key)
+        if cached is not None:
+            logging.getLogger(logger_name).info('Using cached {filetype} output'.format(filetype=filetype))
+            return OutputChunks(cached_output(cached), cached.close)
+
+    # Standard error goes to a file, so a chatty Graphviz can never block on it
+    stderr = TemporaryFile()
+    try:
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+    except OSError as exception:
+        stderr.close()
+        msg = 'had a problem compiling to {filetype}:\n{exception}'.format(filetype=filetype, exception=exception)
         raise SnutreeWriterError(msg)
 
-    return result.stdout
+    feeder = Feeder(process.stdin, source())
+    feeder.start()
 
-@logged
-def compile_dot(src):
+    def stop():
+        # The output might not have been read to the end
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        feeder.join()
+        process.stdout.close()
+        stderr.close()
+
+    return OutputChunks(graphviz_output(process, feeder, stderr, filetype, cache, key, stop), stop)
+
+def cached_output(cached):
     '''
-    Converts the DOT source into bytes suitable for writing (bytes, not
-    characters, are expected by the main output writer).
+    Yields the chunks of the open cache entry, then closes it.
     '''
-    return bytes(src, encoding='utf-8')
+    with cached:
+        yield from FileChunks(cached)()
+
+class Feeder(Thread):
+    '''
+    Thread that writes the chunks to the Graphviz process's standard input,
+    then closes it. Standard input is closed even if producing the chunks
+    fails, so that Graphviz never waits for more input forever; the error is
+    saved to be raised once Graphviz exits (see graphviz_output). If Graphviz
+    exits early, the pipe breaks; the resulting error is reported when the
+    exit status of the process is checked.
+    '''
+
+    def __init__(self, stdin, chunks):
+        super().__init__(daemon=True)
+        self.stdin = stdin
+        self.chunks = chunks
+        self.error = None
+
+    def run(self):
+        try:
+            for chunk in self.chunks:
+                try:
+                    self.stdin.write(chunk)
+                except OSError:
+                    return
+        except BaseException as e: # pylint: disable=broad-except
+            self.error = e
+        finally:
+            try:
+                self.stdin.close()
+            except OSError:
+                pass
+
+def graphviz_output(process, feeder, stderr, filetype, cache, key, stop):
+    '''
+    Yields chunks of output from the running Graphviz process, also writing
+    them to a new cache entry under the key if a FileCache is provided. Raises
+    an error after the last chunk if producing the Graphviz input (see Feeder)
+    or Graphviz itself failed. The zero-argument function `stop` is called
+    once the generator finishes, to stop the process and release its files.
+    '''
+
+    try:
+
+        with ExitStack() as stack:
 
+            cache_file = stack.enter_context(cache.writer(key)) if cache is not None else None
+
+            for chunk in iter(lambda: process.stdout.read(CHUNK_SIZE), b''):
+                if cache_file is not None:
+                    cache_file.write(chunk)
+                yield chunk
+
+            process.wait()
+            feeder.join()
+            if feeder.error is not None:
+                raise feeder.error
+            if process.returncode != 0:
+                stderr.seek(0)
+                captured = stderr.read().decode('utf-8', errors='replace')
+                msg = 'had a problem compiling to {filetype}:\nGraphviz exited with status {code}\nCaptured Standard Error:\n{stderr}'.format(filetype=filetype, code=process.returncode, stderr=captured)
+                raise SnutreeWriterError(msg)
+
+    finally:
+        stop()
+
+class FileChunks:
+    '''
+    Calling a FileChunks object returns a new iterator over the chunks of the
+    binary file it wraps, from the beginning. Any number of these iterators
+    may be used at once, even from different threads.
+    '''
+
+    def __init__(self, f):
+        self.file = f
+        self.lock = Lock()
+
+    def __call__(self):
+        offset = 0
+        while True:
+            with self.lock:
+                self.file.seek(offset)
+                chunk = self.file.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            offset += len(chunk)
+            yield chunk
+
+def write_file(path, output):
+    '''
+    Write the output, which is either bytes or an iterable of chunks of bytes,
+    to the file at the given path. The file is only opened once the first
+    chunk is available (see snutree.api.write_output).
+    '''
+    chunks = iter([output] if isinstance(output, bytes) else output)
+    first = next(chunks, b'')
+    try:
+        with path.open('wb+') as f:
+            for chunk in chain([first], chunks):
+                f.write(chunk)
+    except OSError as e:
+        msg = 'could not write output file {path!r}:\n{e}'.format(path=str(path), e=e)
+        raise SnutreeWriterError(msg)
+
+@lru_cache(maxsize=None)
+def graphviz_version():
+    '''
+    Returns the version string Graphviz prints for `dot -V` (on stderr).
+    '''
+    try:
+        result = subprocess.run(['dot', '-V'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except (OSError, subprocess.CalledProcessError) as exception:
+        msg = 'could not find Graphviz version:\n{exception}'.format(exception=exception)
+        raise SnutreeWriterError(msg)
+    return result.stderr.decode('utf-8', errors='replace').strip()
+
+def compile_dot(dot_graph):
+    '''
+    Yields the DOT source of the dot.Graph in chunks of bytes suitable for
+    writing (bytes, not characters, are expected by the main output writer).
+    '''
+    for chunk in dot_graph.iter_dot():
+        yield bytes(chunk, encoding='utf-8')
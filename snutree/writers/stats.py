@@ -16,7 +16,7 @@ def compile_tree(tree, RankType, config):
 
     max_littles = 0
     most_littles = []
-    for key, out_degree in tree.graph.out_degree_iter():
+    for key, out_degree in tree.out_degrees():
         if out_degree > max_littles:
             most_littles = [key]
             max_littles = out_degree
@@ -24,8 +24,8 @@ def compile_tree(tree, RankType, config):
             most_littles.append(key)
 
     output_fields = {
-        'members' : tree.graph.number_of_nodes(),
-        'relationships' : tree.graph.number_of_edges(),
+        'members' : len(tree),
+        'relationships' : tree.number_of_edges(),
         'singletons' : len(list(tree.singletons())),
         'max_littles' : max_littles,
         'most_littles' : most_littles,
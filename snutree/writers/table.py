@@ -21,6 +21,9 @@ def compile_table(table):
 
     # The following is definitely inefficient
 
+    # The table might be a one-pass iterator, but it is read twice here
+    table = list(table)
+
     # Find all the headers
     fieldnames = {}
     for row in table:
@@ -0,0 +1,15 @@
+from pathlib import Path
+import pytest
+
+@pytest.fixture(autouse=True)
+def registry_path(tmpdir, monkeypatch):
+    '''
+    Keep the plugin registry out of the user's real cache directory.
+    '''
+    # Imported here, so that collecting the tests does not import the API
+    from snutree import api
+    path = Path(str(tmpdir))/'plugins.json'
+    monkeypatch.setattr(api, 'REGISTRY_PATH', path)
+    api.get_writer_registry.cache_clear()
+    yield path
+    api.get_writer_registry.cache_clear()
@@ -0,0 +1,66 @@
+import gc
+import time
+from io import BytesIO
+from threading import Event
+import pytest
+from snutree import api
+from snutree.errors import SnutreeError
+
+def test_read_ahead(monkeypatch):
+
+    monkeypatch.setattr(api, 'READ_AHEAD_BATCH_SIZE', 3)
+    assert list(api.read_ahead(iter(range(10)))) == list(range(10))
+    assert list(api.read_ahead(iter([]))) == []
+
+    def failing():
+        yield 1
+        yield 2
+        raise SnutreeError('failed')
+
+    rows = api.read_ahead(failing())
+    assert next(rows) == 1
+    assert next(rows) == 2
+    with pytest.raises(SnutreeError):
+        next(rows)
+
+def test_read_ahead_bounded(monkeypatch):
+
+    monkeypatch.setattr(api, 'READ_AHEAD_BATCH_SIZE', 1)
+    read = []
+    closed = Event()
+
+    def endless():
+        try:
+            while True:
+                read.append(None)
+                yield len(read)
+        finally:
+            closed.set()
+
+    # Only a few batches are read ahead of the rows consumed
+    rows = api.read_ahead(endless())
+    assert next(rows) == 1
+    time.sleep(0.5)
+    assert len(read) <= 2 + api.READ_AHEAD_BATCHES
+
+    # Reading stops once the iterator is closed
+    rows.close()
+    assert closed.wait(timeout=5)
+
+    # Reading also stops if an iterator is dropped before it is started
+    closed.clear()
+    rows = api.read_ahead(endless())
+    del rows
+    gc.collect()
+    assert closed.wait(timeout=5)
+
+def test_get_member_table_order():
+
+    def csv(name, rows):
+        f = BytesIO('name\n{rows}\n'.format(rows='\n'.join(rows)).encode('utf-8'))
+        f.name = name
+        return f
+
+    files = [csv('{i}.csv'.format(i=i), [str(j) for j in range(i*1000, i*1000 + 500)]) for i in range(5)]
+    names = [row['name'] for row in api.get_member_table(files, {})]
+    assert names == [str(j) for i in range(5) for j in range(i*1000, i*1000 + 500)]
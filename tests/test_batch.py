@@ -0,0 +1,106 @@
+import shutil
+from pathlib import Path
+from inspect import cleandoc as trim
+import pytest
+from snutree import api, cli
+from snutree.errors import SnutreeError
+
+EXAMPLES_ROOT = Path(__file__).parent/'../examples'
+
+def test_batch(tmpdir):
+
+    tmpdir = Path(str(tmpdir))
+
+    (tmpdir/'table.csv').write_text(trim('''
+        name,big_name,semester
+        Bob,Sue,Fall 1967
+        Sue,,Spring 1965
+    ''') + '\n', encoding='utf-8')
+
+    (tmpdir/'config.yaml').write_text(trim('''
+        writer:
+          defaults:
+            graph:
+              all:
+                label: Batch
+    ''') + '\n', encoding='utf-8')
+
+    (tmpdir/'manifest.yaml').write_text(trim('''
+        defaults:
+          input: [table.csv]
+        jobs:
+          - output: a.dot
+          - output: b.dot
+            config: [config.yaml]
+          - output: c.txt
+    ''') + '\n', encoding='utf-8')
+
+    cli.invoke([str(tmpdir/'table.csv'), '-o', str(tmpdir/'expected.dot')])
+
+    for workers in ('1', '2'):
+        cli.invoke(['batch', '--jobs', workers, str(tmpdir/'manifest.yaml')])
+        assert (tmpdir/'a.dot').read_text() == (tmpdir/'expected.dot').read_text()
+        assert 'label="Batch"' in (tmpdir/'b.dot').read_text()
+        assert (tmpdir/'c.txt').exists()
+
+def test_batch_failures(tmpdir):
+
+    tmpdir = Path(str(tmpdir))
+    (tmpdir/'manifest.yaml').write_text(trim('''
+        jobs:
+          - input: [missing.csv]
+            output: a.dot
+    ''') + '\n', encoding='utf-8')
+
+    with pytest.raises(SnutreeError) as exc_info:
+        with (tmpdir/'manifest.yaml').open() as f:
+            api.generate_batch(f)
+    assert 'missing.csv' in str(exc_info.value)
+
+    # Failing to write one output does not stop the other jobs
+    (tmpdir/'manifest.yaml').write_text(trim('''
+        jobs:
+          - input: [table.csv]
+            output: missing/a.dot
+          - input: [table.csv]
+            output: b.dot
+    ''') + '\n', encoding='utf-8')
+    (tmpdir/'table.csv').write_text('name,big_name,semester\nBob,,Fall 1967\n', encoding='utf-8')
+
+    with pytest.raises(SnutreeError) as exc_info:
+        with (tmpdir/'manifest.yaml').open() as f:
+            api.generate_batch(f, workers=1)
+    assert '1 of 2' in str(exc_info.value)
+    assert (tmpdir/'b.dot').exists()
+
+def test_batch_custom_module(tmpdir, monkeypatch):
+
+    tmpdir = Path(str(tmpdir))
+    example = EXAMPLES_ROOT/'custom'
+    job = tmpdir/'job'
+    job.mkdir()
+    for name in ('custom_module.py', 'custom.csv', 'config.yaml'):
+        shutil.copy(str(example/name), str(job/name))
+
+    (job/'manifest.yaml').write_text(trim('''
+        jobs:
+          - input: [custom.csv]
+            output: custom.dot
+            config: [config.yaml]
+            schema: custom_module.py
+    ''') + '\n', encoding='utf-8')
+
+    # Custom module paths are relative to the manifest, not the working directory
+    monkeypatch.chdir(str(tmpdir))
+    with (job/'manifest.yaml').open() as f:
+        api.generate_batch(f, workers=1)
+    assert (job/'custom.dot').read_text(encoding='utf-8') == (example/'custom.dot').read_text(encoding='utf-8')
+
+def test_input_named_like_subcommand(tmpdir, monkeypatch):
+
+    # An existing file named 'batch' is an input file, not the subcommand
+    monkeypatch.chdir(str(tmpdir))
+    Path('batch').write_text('name,big_name,semester\n', encoding='utf-8')
+    with pytest.raises(SnutreeError) as exc_info:
+        cli.invoke(['batch', '--output', 'tree.dot'])
+    assert 'input file format' in str(exc_info.value)
@@ -0,0 +1,89 @@
+import logging
+from pathlib import Path
+from inspect import cleandoc as trim
+from snutree import cli
+from snutree.cache import fingerprint
+
+def test_fingerprint_order():
+    assert fingerprint({'a' : 1, 'b' : 2}) == fingerprint({'b' : 2, 'a' : 1})
+    assert fingerprint({'a' : 1}) != fingerprint({'a' : '1'})
+
+def test_incremental(tmpdir):
+
+    tmpdir = Path(str(tmpdir))
+    table = tmpdir/'table.csv'
+    cache = tmpdir/'cache'
+
+    def run(output, *args):
+        cli.invoke([str(table), '--output', str(tmpdir/output), *args])
+        return (tmpdir/output).read_text(encoding='utf-8')
+
+    table.write_text(trim('''
+        name,big_name,semester
+        Bob,Sue,Fall 1967
+        Sue,,Spring 1965
+    ''') + '\n', encoding='utf-8')
+    assert run('a.dot', '--cache', str(cache)) == run('b.dot')
+    assert run('c.dot', '--cache', str(cache)) == run('b.dot')
+
+    # Change one row, delete one, and insert another
+    table.write_text(trim('''
+        name,big_name,semester
+        Bob,,Fall 1967
+        Jim,Bob,Fall 1968
+    ''') + '\n', encoding='utf-8')
+    assert run('d.dot', '--cache', str(cache)) == run('e.dot')
+
+def test_incremental_outputs(tmpdir):
+
+    tmpdir = Path(str(tmpdir))
+    table = tmpdir/'table.csv'
+    config = tmpdir/'config.yaml'
+    extra = tmpdir/'extra.dot'
+    cache = tmpdir/'cache'
+
+    table.write_text(trim('''
+        name,big_name,semester
+        Bob,Sue,Fall 1967
+        Sue,,Spring 1965
+    ''') + '\n', encoding='utf-8')
+    config.write_text(trim('''
+        writer:
+          outputs:
+            - {extra}
+    ''').format(extra=extra) + '\n', encoding='utf-8')
+
+    def run():
+        cli.invoke([str(table), '--config', str(config), '--output', str(tmpdir/'a.dot'), '--cache', str(cache)])
+
+    # The additional output is written again even though nothing changed
+    run()
+    extra.unlink()
+    run()
+    assert extra.read_text(encoding='utf-8') == (tmpdir/'a.dot').read_text(encoding='utf-8')
+
+def test_incremental_sigmanu(tmpdir, caplog):
+
+    tmpdir = Path(str(tmpdir))
+    example = Path(__file__).parent/'../examples/sigmanu'
+    knights = tmpdir/'sigmanu.csv'
+    others = tmpdir/'sigmanu_nonknights.csv'
+    cache = tmpdir/'cache'
+    knights.write_bytes((example/'sigmanu.csv').read_bytes())
+    others.write_bytes((example/'sigmanu_nonknights.csv').read_bytes())
+
+    def run(output, *args):
+        configs = ['--config', str(example/'config-input.yaml'), '--config', str(example/'config.yaml')]
+        cli.invoke([*configs, str(others), str(knights), '--output', str(tmpdir/output), *args])
+        return (tmpdir/output).read_text(encoding='utf-8')
+
+    assert run('a.dot', '--cache', str(cache)) == (example/'sigmanu.dot').read_text(encoding='utf-8')
+
+    # Change one row and delete another; generated keys and checks across
+    # rows are still made for every row
+    header, first, _, *rest = knights.read_text(encoding='utf-8').splitlines()
+    knights.write_text('\n'.join([header, first.replace('Ziyi', 'Zi'), *rest]) + '\n', encoding='utf-8')
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger='snutree.cache'):
+        assert run('b.dot', '--cache', str(cache)) == run('c.dot')
+    assert 'validated 1 new or changed rows' in caplog.text
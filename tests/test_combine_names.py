@@ -1,5 +1,7 @@
+import difflib
+import random
 import pytest
-from snutree.schemas.sigmanu import combine_names
+from snutree.schemas.sigmanu import combine_names, similar
 
 @pytest.mark.parametrize('names, combined_name', [
     (('Jon', 'Freaking', 'Snow'), 'Freaking Snow'),
@@ -18,3 +20,11 @@ def test_combine_names_not_equal(names, combined_name):
     assert combine_names(*names) != combined_name
 
 
+
+def test_similar():
+    # The shortcuts never change the result of comparing against the ratio
+    rng = random.Random(0)
+    word = lambda: ''.join(rng.choice('abcde') for _ in range(rng.randint(0, 8)))
+    for _ in range(2000):
+        a, b, threshold = word(), word(), rng.choice([0, .25, .5, .75, 1])
+        assert similar(a, b, threshold) == (difflib.SequenceMatcher(None, a, b).ratio() >= threshold)
@@ -105,3 +105,32 @@ def test_Graph():
             {rank=same "Key One" "Key Two"};
         }''') + '\n' # there is a final EOL that `trim` would normally trim
 
+
+def test_iter_dot():
+
+    graph = Graph('tree', 'digraph', attributes={'size' : 5}, children=[
+        Defaults('node'), # Empty, so it yields no chunks
+        Node('A'),
+        Graph('sub', 'subgraph', children=[Node('B'), Edge('A', 'B')]),
+    ])
+
+    chunks = list(graph.iter_dot())
+    assert ''.join(chunks) == graph.to_dot()
+    assert all(chunk.endswith('\n') for chunk in chunks)
+    assert len(chunks) == 8
+
+def test_attributes_cache():
+
+    # Equal values of different types must not share cached DOT code
+    assert Node('A', {'width' : 1}).to_dot() == '"A" [width="1"];\n'
+    assert Node('A', {'width' : True}).to_dot() == '"A" [width="True"];\n'
+    assert Node('A', {'width' : 1.0}).to_dot() == '"A" [width="1.0"];\n'
+
+    # Changing the attributes changes the DOT code
+    node = Node('A', {'label' : '<B>'})
+    assert node.to_dot() == '"A" [label=<B>];\n'
+    node.attributes['color'] = 'red'
+    assert node.to_dot() == '"A" [color="red",label=<B>];\n'
+
+    # Unhashable values are formatted without the cache
+    assert Node('A', {'pos' : [1, 2]}).to_dot() == '"A" [pos="[1, 2]"];\n'
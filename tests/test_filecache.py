@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+import pytest
+from snutree.utilities.filecache import FileCache, atomic_writer
+
+def test_key():
+    assert FileCache.key('ab', 'c') != FileCache.key('a', 'bc')
+    assert FileCache.key('abc', 'pdf') == FileCache.key(b'abc', 'pdf')
+
+def test_get_put(tmpdir):
+    cache = FileCache(Path(str(tmpdir)), max_size=100)
+    assert cache.get('a') is None
+    cache.put('a', b'12345')
+    assert cache.get('a') == b'12345'
+
+def test_evict_least_recently_used(tmpdir):
+
+    cache = FileCache(Path(str(tmpdir)), max_size=10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+
+    # Make 'a' look older than 'b', then use it so it is the newest
+    os.utime(str(cache.path('a')), (0, 0))
+    os.utime(str(cache.path('b')), (1, 1))
+    assert cache.get('a') is not None
+
+    cache.put('c', b'12345')
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+
+def test_key_chunks():
+    assert FileCache.key('dot', iter([b'ab', b'c'])) == FileCache.key('dot', iter([b'a', b'bc']))
+    assert FileCache.key('dot', iter([b'abc'])) != FileCache.key('dot', b'abc')
+
+def test_writer(tmpdir):
+
+    cache = FileCache(Path(str(tmpdir)), max_size=100)
+
+    with cache.writer('a') as f:
+        f.write(b'123')
+        f.write(b'45')
+    with cache.open('a') as f:
+        assert f.read() == b'12345'
+
+    # Failed writes are not stored
+    try:
+        with cache.writer('b') as f:
+            f.write(b'123')
+            raise ValueError
+    except ValueError:
+        pass
+    assert cache.open('b') is None
+    assert os.listdir(str(tmpdir)) == [cache.path('a').name]
+
+def test_atomic_writer(tmpdir):
+
+    path = Path(str(tmpdir))/'a'/'file'
+    with atomic_writer(path) as f:
+        f.write(b'123')
+    assert path.read_bytes() == b'123'
+
+    # The old contents are kept if the write fails
+    with pytest.raises(ValueError):
+        with atomic_writer(path) as f:
+            f.write(b'456')
+            raise ValueError
+    assert path.read_bytes() == b'123'
+    assert os.listdir(str(path.parent)) == ['file']
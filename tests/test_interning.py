@@ -0,0 +1,8 @@
+from snutree.utilities.interning import InternTable
+
+def test_intern_table():
+    table = InternTable(max_size=2)
+    assert table.add('a', 1) == 1
+    assert table.add('b', 2) == 2
+    assert table.add('c', 3) == 3
+    assert table == {'a' : 1, 'b' : 2}
@@ -14,6 +14,14 @@ def test_csv_error():
     with pytest.raises(SnutreeReaderError):
         next(row_generator)
 
+def test_csv_streaming():
+    # Rows before a malformed line are yielded before the error is raised
+    csv_stream = BytesIO(b'"A","B"\n1,2\n3,"4"4\n')
+    row_generator = csv.get_table(csv_stream)
+    assert next(row_generator) == {'A' : '1', 'B' : '2'}
+    with pytest.raises(SnutreeReaderError):
+        next(row_generator)
+
 def test_sql_mysql_error():
     with pytest.raises(SnutreeReaderError):
         sql.get_members_local('', {})
@@ -23,6 +31,88 @@ def test_sql_ssh_error():
     with pytest.raises(SnutreeReaderError):
         sql.get_members_ssh('', conf, conf)
 
+def test_sql_pool():
+
+    class Connection:
+        def __init__(self):
+            self.alive = True
+        def ping(self):
+            if not self.alive:
+                raise OSError
+        def close(self):
+            self.alive = False
+
+    pool = sql.ConnectionPool()
+    key = sql.frozen({'host' : 'a', 'port' : 1})
+    cxn = pool.connection(key, Connection)
+
+    # Connections are not shared while they are in use
+    assert pool.connection(key, Connection) is not cxn
+
+    # Released connections are reused, unless they have gone stale
+    pool.release(key, cxn)
+    assert pool.connection(key, Connection) is cxn
+    pool.release(key, cxn)
+    cxn.close()
+    assert pool.connection(key, Connection) is not cxn
+
+    pool.release(key, cxn)
+    pool.close()
+    assert not pool.connections
+
+def test_sql_fetch_rows(monkeypatch):
+
+    class Cursor:
+        def __init__(self, rows):
+            self.rows = rows
+            self.batches = []
+            self.closed = False
+        def execute(self, query):
+            pass
+        def fetchmany(self, size):
+            self.batches.append(size)
+            batch, self.rows = self.rows[:size], self.rows[size:]
+            return batch
+        def close(self):
+            self.closed = True
+
+    class Connection:
+        def __init__(self):
+            self.cursors = []
+            self.closed = False
+        def cursor(self, cursor_class):
+            self.cursors.append(Cursor([{'name' : str(i)} for i in range(5)]))
+            return self.cursors[-1]
+        def ping(self):
+            pass
+        def close(self):
+            self.closed = True
+
+    pool = sql.ConnectionPool()
+    monkeypatch.setattr(sql, 'POOL', pool)
+    key = sql.frozen({'host' : 'a'})
+    connections = []
+    def connect():
+        connections.append(Connection())
+        return connections[-1]
+
+    # Nothing is done until the first row is requested
+    rows = sql.fetch_rows('', key, connect, None, 2, OSError)
+    assert not connections
+
+    # Rows are fetched in batches, and the connection is released once read
+    assert [row['name'] for row in rows] == ['0', '1', '2', '3', '4']
+    cxn, = connections
+    assert cxn.cursors[0].batches == [2, 2, 2, 2]
+    assert cxn.cursors[0].closed
+    assert pool.connections[key] == [cxn] and not cxn.closed
+
+    # Connections of iterators that stop early are closed instead
+    rows = sql.fetch_rows('', key, connect, None, 2, OSError)
+    next(rows)
+    rows.close()
+    assert cxn.closed and not pool.connections[key]
+
 def test_dot_no_error():
     dot_stream = BytesIO(b'digraph { a -> b; }')
     dot.get_table(dot_stream)
@@ -0,0 +1,29 @@
+import pytest
+from snutree import api
+
+# pylint: disable=redefined-outer-name
+
+def test_registry(registry_path, monkeypatch):
+
+    writers = api.get_writer_registry()
+    assert writers['dot'] == ['dot', 'eps', 'pdf', 'svg']
+    assert registry_path.exists()
+
+    # A saved registry is used without importing any writers
+    def fail(name):
+        raise AssertionError(name)
+    monkeypatch.setattr(api, 'get_writer_module', fail)
+    api.get_writer_registry.cache_clear()
+    assert api.get_writer_registry() == writers
+
+    # ... unless a writer file has changed
+    signature = api.get_plugin_signature
+    monkeypatch.setattr(api, 'get_plugin_signature', lambda subpackage, name: signature(subpackage, name) + [0])
+    api.get_writer_registry.cache_clear()
+    with pytest.raises(AssertionError):
+        api.get_writer_registry()
+
+def test_find_writer_module(registry_path):
+    name, module = api.find_writer_module('txt')
+    assert name == 'stats'
+    assert 'txt' in module.filetypes
@@ -51,3 +51,11 @@ def test_math():
 def test_subtract():
     assert str(Semester('Fall 2001') - 1) == 'Spring 2001'
 
+
+def test_interned():
+    assert Semester('Fall 1995') is d
+    assert Semester('Fall 001995') is d
+    assert Semester(int(d)) is d
+    assert c + 1 is d
+    assert d - 1 is c
+    assert repr(d) is repr(d)
@@ -0,0 +1,61 @@
+import csv
+import json
+import sys
+import urllib.request
+from pathlib import Path
+from threading import Thread
+import pytest
+from snutree import server
+
+ROOT = Path(__file__).parent.parent
+BASIC = ROOT/'examples'/'basic'
+
+def basic_request(**kwargs):
+    with (BASIC/'basic.csv').open(encoding='utf-8') as f:
+        members = list(csv.DictReader(f))
+    return json.dumps(dict(members=members, **kwargs)).encode('utf-8')
+
+def test_render_request():
+    status, content_type, output = server.render_request(basic_request(seed=71))
+    assert (status, content_type) == (200, server.CONTENT_TYPES['dot'])
+    assert output == (BASIC/'basic.dot').read_bytes()
+
+def test_render_request_errors():
+
+    status, _, output = server.render_request(b'[]')
+    assert status == 400 and b'JSON object' in output
+
+    status, _, output = server.render_request(basic_request(schema='custom.py'))
+    assert status == 400 and b'schema must be one of' in output
+
+    status, _, output = server.render_request(basic_request(config={'writer' : {'outputs' : ['x.pdf']}}))
+    assert status == 400 and b'outputs' in output
+
+    status, _, output = server.render_request(basic_request(config={'schema' : {'workers' : 500}}))
+    assert status == 400 and b'workers' in output
+
+    status, _, output = server.render_request(json.dumps({'members' : [{'name' : 'x'}]}).encode('utf-8'))
+    assert status == 400 and b'semester' in output
+
+def test_server():
+
+    with server.RenderServer(('127.0.0.1', 0), workers=1, queue_size=0) as render_server:
+
+        thread = Thread(target=render_server.serve_forever)
+        thread.start()
+        try:
+            url = 'http://127.0.0.1:{port}/render'.format(port=render_server.server_address[1])
+            request = urllib.request.Request(url, data=basic_request(format='txt'), method='POST')
+            with urllib.request.urlopen(request) as response:
+                assert response.headers['Content-Type'] == server.CONTENT_TYPES['txt']
+                assert response.read().startswith(b'members=200\n')
+        finally:
+            render_server.shutdown()
+            thread.join()
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='Unix sockets are unavailable')
+def test_unix_server_cleanup(tmpdir):
+    path = Path(str(tmpdir))/'snutree.sock'
+    with server.UnixRenderServer(str(path), workers=1, queue_size=0):
+        assert path.exists()
+    assert not path.exists()
@@ -1,3 +1,4 @@
+import pickle
 import string
 import pytest
 import snutree.schemas.sigmanu as sn
@@ -100,3 +101,46 @@ def test_sorting():
     a, c, b, d = tuple(sn.Affiliation(s) for s in ('ΔA 1', 'Α 2', 'ΔA 2', 'Ω 1'))
     assert sorted([a, c, b, d]) == [a, b, c, d]
 
+
+def test_parallel_to_Members():
+
+    def rows():
+        for i in range(1, 2500):
+            if i % 3 == 0:
+                yield {'status' : 'Candidate', 'first_name' : 'C', 'last_name' : str(i), 'semester' : 'Fall 2000'}
+            elif i % 5 == 0:
+                yield {'status' : 'Brother', 'last_name' : str(i), 'big_badge' : str(i - 1), 'semester' : 'Fall 2000'}
+            else:
+                yield {'status' : 'Active', 'badge' : str(i), 'first_name' : 'K', 'last_name' : str(i),
+                       'semester' : 'Fall 2000', 'affiliations' : 'Ω {i}'.format(i=i)}
+
+    members = lambda table, workers: [
+            (type(m).__name__, m.key, m.parent, m.rank, sorted(m.affiliations))
+            for m in sn.to_Members(table, chapter='Delta Alpha', workers=workers)
+            ]
+    assert members(rows(), 2) == members(rows(), 1)
+
+    # The first error is found in either mode
+    bad_rows = lambda: list(rows()) + [{'status' : 'Active', 'badge' : '1', 'first_name' : 'K', 'last_name' : 'D'}]
+    for workers in (1, 2):
+        with pytest.raises(sn.SnutreeError) as e:
+            members(bad_rows(), workers)
+        assert 'duplicate affiliation' in str(e.value)
+
+def test_interned():
+    a = sn.Affiliation('Delta Alpha 5')
+    assert sn.Affiliation('ΔA 5') is a
+    assert sn.Affiliation('ΔΑ', 5) is a
+    assert sn.Affiliation('Delta Alpha 5') is a
+    assert pickle.loads(pickle.dumps(a)) is a
+
+def test_knight_label(monkeypatch):
+    monkeypatch.setattr(sn.SigmaNuMember, 'chapter', sn.Affiliation.str_to_designation('ΔA'))
+    knight = sn.Knight(status='Active', badge='10', first_name='A', last_name='B',
+                       affiliations=[sn.Affiliation('Α 3')])
+    assert knight.label == 'A B\\nΔΑ\N{NO-BREAK SPACE}10, Α\N{NO-BREAK SPACE}3'
+    assert knight.label is knight.label
+
+    # Labels follow the primary chapter
+    monkeypatch.setattr(sn.SigmaNuMember, 'chapter', sn.Affiliation.str_to_designation('Α'))
+    assert knight.label == 'A B\\nΑ\N{NO-BREAK SPACE}3, ΔΑ\N{NO-BREAK SPACE}10'
@@ -0,0 +1,54 @@
+'''
+Startup time matters when snutree is invoked many times in a row (e.g., once
+per chapter), so the command-line interface must not import snutree's heavier
+dependencies until it actually runs.
+'''
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+import snutree
+
+ROOT = Path(__file__).parent.parent
+
+# Modules that must not be imported just to parse arguments
+HEAVY_MODULES = {'yaml', 'cerberus', 'pluginbase', 'voluptuous', 'pkg_resources', 'networkx'}
+
+# Budget for the time spent importing snutree's own modules (not counting the
+# modules they import), in microseconds. It is generous, so that the test only
+# fails when something slow is done at import time, not on a loaded machine.
+IMPORT_TIME_BUDGET = 100000
+
+def run_python(*args):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.run([sys.executable] + list(args), env=env, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+def test_deferred_imports():
+    result = run_python('-c', 'import sys, snutree.cli; print(*sys.modules)')
+    imported = {name.split('.')[0] for name in result.stdout.split()}
+    assert not imported & HEAVY_MODULES
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime requires Python 3.7')
+def test_import_time():
+
+    result = run_python('-X', 'importtime', '-c', 'import snutree.cli')
+
+    # Lines look like "import time: <self> | <cumulative> | <indented name>"
+    self_times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            own, _, name = line[len('import time:'):].split('|')
+            if own.strip().isdigit():
+                self_times[name.strip()] = int(own)
+
+    assert 'snutree.cli' in self_times
+    snutree_time = sum(time for name, time in self_times.items() if name.split('.')[0] == 'snutree')
+    assert snutree_time < IMPORT_TIME_BUDGET
+
+def test_version():
+    # The version is still available as an attribute, but only looked up when used
+    result = run_python('-c', 'import snutree; print(snutree.version)')
+    assert result.stdout.strip() == snutree.get_version()
@@ -1,7 +1,7 @@
 from functools import partial
 import pytest
 from snutree.schemas.basic import KeylessMember
-from snutree.tree import FamilyTree, TreeError, TreeErrorCode
+from snutree.tree import FamilyTree, TreeEntity, TreeError, TreeErrorCode
 
 # pylint: disable=redefined-outer-name
 
@@ -43,3 +43,45 @@ def test_parent_not_prior(members):
     code = TreeErrorCode.PARENT_NOT_PRIOR
     assert tree_error_code_of(func) == code
 
+
+def test_remove(members):
+    tree = FamilyTree(members)
+    assert [m.key for m in tree.orphans()] == ['Bob Dole']
+    tree.remove(['Rob Cole'])
+    assert list(tree.keys()) == ['Bob Dole']
+    assert tree.number_of_edges() == 0
+    assert [m.key for m in tree.singletons()] == ['Bob Dole']
+
+def test_families(members):
+    members.append(KeylessMember.from_dict({
+        'name' : 'Sue Stu',
+        'semester' : 'Fall 2001',
+    }))
+    tree = FamilyTree(members)
+    assert tree['Bob Dole']['family'] is tree['Rob Cole']['family']
+    assert tree['Bob Dole']['family'] is not tree['Sue Stu']['family']
+
+def test_ordered_items_cache(members):
+    tree = FamilyTree(members)
+    items = [key for key, _ in tree.ordered_items()]
+    assert items == ['Bob Dole', 'Rob Cole']
+    tree.remove(['Rob Cole'])
+    assert [key for key, _ in tree.ordered_items()] == ['Bob Dole']
+
+def test_ranks(members):
+
+    members.append(KeylessMember.from_dict({
+        'name' : 'Sue Stu',
+        'semester' : 'Fall 2003',
+    }))
+    tree = FamilyTree(members)
+    min_rank, max_rank = tree.get_rank_bounds()
+    assert (str(min_rank), str(max_rank)) == ('Fall 2000', 'Fall 2003')
+    assert tree.keys_by_rank(min_rank, max_rank + 1) == [['Bob Dole'], [], ['Rob Cole'], [], [], [], ['Sue Stu']]
+
+    tree.remove(['Sue Stu'])
+    assert str(tree.get_rank_bounds()[1]) == 'Fall 2001'
+
+    tree.add_entity(TreeEntity('Unranked'))
+    assert tree_error_code_of(tree.get_rank_bounds) == TreeErrorCode.ACCESS_MISSING_RANK
+    assert tree_error_code_of(partial(tree.keys_by_rank, min_rank, max_rank)) == TreeErrorCode.ACCESS_MISSING_RANK
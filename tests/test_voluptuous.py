@@ -0,0 +1,51 @@
+import pytest
+from voluptuous import Schema, Required, Optional, Coerce, ALLOW_EXTRA
+from voluptuous.error import Error
+from voluptuous.humanize import validate_with_humanized_errors
+from snutree.utilities.voluptuous import CompiledSchema, NonEmptyString, Digits
+
+SCHEMA = Schema({
+    Required('a') : NonEmptyString,
+    Optional('b') : Digits,
+    'c' : Coerce(int),
+    })
+
+@pytest.mark.parametrize('dct', [
+    {'a' : 'x'},
+    {'a' : 'x', 'b' : '12', 'c' : '5'},
+    {'a' : 'x', 'c' : 5},
+    ])
+def test_compiled_success(dct):
+    assert CompiledSchema(SCHEMA)(dct) == validate_with_humanized_errors(dct, SCHEMA)
+
+@pytest.mark.parametrize('dct', [
+    {}, # Missing required key
+    {'a' : ''}, # Invalid value
+    {'a' : 'x', 'c' : 'y'}, # Invalid coercion
+    {'a' : 'x', 'd' : 'y'}, # Extra key
+    {'a' : None, 'b' : 'y', 'd' : 'z'}, # Several errors
+    ['a'], # Not a dictionary
+    ])
+def test_compiled_failure(dct):
+    with pytest.raises(Error) as expected:
+        validate_with_humanized_errors(dct, SCHEMA)
+    with pytest.raises(Error) as actual:
+        CompiledSchema(SCHEMA)(dct)
+    assert str(actual.value) == str(expected.value)
+
+@pytest.mark.parametrize('schema, dct', [
+    (Schema({'a' : str}), {'a' : 'x'}), # Types are checked with isinstance, not called
+    (Schema({'a' : {'b' : int}}), {'a' : {'b' : 1}}), # Nested schema
+    (Schema({'a' : NonEmptyString}, extra=ALLOW_EXTRA), {'a' : 'x', 'b' : 'y'}),
+    (Schema({Required('a', default='x') : NonEmptyString}), {}),
+    ])
+def test_uncompiled(schema, dct):
+    compiled = CompiledSchema(schema)
+    assert compiled.validators is None
+    assert compiled(dct) == schema(dct)
+
+def test_required():
+    compiled = CompiledSchema(Schema({'a' : Digits, Optional('b') : Digits}, required=True))
+    assert compiled.required == {'a'}
+    with pytest.raises(Error):
+        compiled({'b' : '1'})
@@ -1,7 +1,15 @@
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from inspect import cleandoc as trim
 import pytest
 from snutree.schemas.basic import KeylessMember
 from snutree.tree import FamilyTree
-from snutree.writers.dot import add_colors, add_custom_edges
+from snutree.utilities.semester import Semester
+from snutree.writers.dot import add_colors, add_custom_edges, compile_tree, compiled_all, run_graphviz
+from snutree.utilities import dot
 from snutree.errors import SnutreeWriterError
 
 # pylint: disable=redefined-outer-name
@@ -33,3 +41,124 @@ def test_family_color_conflict(members):
     with pytest.raises(SnutreeWriterError):
         add_colors(tree, family_colors)
 
+def test_outputs_extension(members):
+    tree = FamilyTree(members)
+    config = {'filetype' : 'dot', 'outputs' : ['tree.txt']}
+    with pytest.raises(SnutreeWriterError):
+        compile_tree(tree, Semester, config)
+
+@pytest.fixture
+def processes(monkeypatch):
+    '''
+    Records every process started with subprocess.Popen in the returned list.
+    '''
+    started = []
+    popen = subprocess.Popen
+    def recorded_popen(*args, **kwargs):
+        process = popen(*args, **kwargs)
+        started.append(process)
+        return process
+    monkeypatch.setattr(subprocess, 'Popen', recorded_popen)
+    return started
+
+# Stands in for Graphviz by copying its standard input to its output
+CAT = [sys.executable, '-c', 'import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)']
+
+def test_run_graphviz():
+    source = lambda: iter([b'digraph {', b'}'])
+    assert b''.join(run_graphviz(CAT, source, 'dot')) == b'digraph {}'
+
+def test_run_graphviz_source_error():
+
+    def source():
+        yield b'digraph {'
+        raise ValueError('bad source')
+
+    # Graphviz is not left waiting for the rest of its input
+    with pytest.raises(ValueError):
+        b''.join(run_graphviz(CAT, source, 'dot'))
+
+def fake_graphviz(bin_path, monkeypatch, code):
+    '''
+    Put fake dot and neato commands, which run the given Python code, at the
+    front of the PATH.
+    '''
+    bin_path.mkdir(exist_ok=True)
+    for command in ('dot', 'neato'):
+        script = bin_path/command
+        script.write_text('#!{python}\n'.format(python=sys.executable) + trim(code))
+        script.chmod(0o755)
+    monkeypatch.setenv('PATH', str(bin_path) + os.pathsep + os.environ['PATH'])
+
+def test_run_graphviz_close(processes):
+
+    # Graphviz is stopped even if its output was never read
+    source = lambda: iter([bytes(2**22)])
+    run_graphviz(CAT, source, 'dot').close()
+    assert processes[0].poll() is not None
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='fake Graphviz commands are shell scripts')
+def test_layout_once(tmpdir, monkeypatch):
+
+    # Fake Graphviz commands that prefix their input with their arguments
+    bin_path = Path(str(tmpdir))
+    fake_graphviz(bin_path, monkeypatch, '''
+        import sys
+        sys.stdout.buffer.write(bytes(' '.join(sys.argv) + '\\n', encoding='utf-8'))
+        sys.stdout.buffer.write(sys.stdin.buffer.read())
+    ''')
+
+    graph = dot.Graph('tree', 'digraph')
+    source = graph.to_dot().encode('utf-8')
+    outputs = [b''.join(output) for output in compiled_all(graph, ['dot', 'svg', 'pdf'])]
+
+    # Both Graphviz outputs are rendered from the same laid-out graph
+    laid_out = '{dot} -Txdot\n'.format(dot=bin_path/'dot').encode('utf-8') + source
+    assert outputs == [
+        source,
+        '{neato} -n2 -Tsvg\n'.format(neato=bin_path/'neato').encode('utf-8') + laid_out,
+        '{neato} -n2 -Tpdf\n'.format(neato=bin_path/'neato').encode('utf-8') + laid_out,
+    ]
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='fake Graphviz commands are shell scripts')
+def test_compiled_all_start_error(processes, tmpdir, monkeypatch):
+
+    # Fake Graphviz commands with more output than fits in a pipe
+    fake_graphviz(Path(str(tmpdir)), monkeypatch, '''
+        import sys
+        sys.stdin.buffer.read()
+        sys.stdout.buffer.write(bytes(2**22))
+    ''')
+
+    # The layout and the first output start, but the second cannot
+    recorded_popen = subprocess.Popen
+    def failing_popen(*args, **kwargs):
+        if len(processes) == 2:
+            raise OSError('too many processes')
+        return recorded_popen(*args, **kwargs)
+    monkeypatch.setattr(subprocess, 'Popen', failing_popen)
+
+    with pytest.raises(SnutreeWriterError):
+        compiled_all(dot.Graph('tree', 'digraph'), ['svg', 'pdf'])
+    assert len(processes) == 2
+    assert all(process.poll() is not None for process in processes)
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='fake Graphviz commands are shell scripts')
+def test_unwritable_output(members, processes, tmpdir, monkeypatch):
+
+    # Fake Graphviz commands with more output than fits in a pipe
+    fake_graphviz(Path(str(tmpdir))/'bin', monkeypatch, '''
+        import sys
+        sys.stdin.buffer.read()
+        sys.stdout.buffer.write(bytes(2**22))
+    ''')
+
+    threads = set(threading.enumerate())
+    config = {'filetype' : 'pdf', 'outputs' : [str(Path(str(tmpdir))/'nodir'/'extra.svg')]}
+    with pytest.raises(SnutreeWriterError):
+        compile_tree(FamilyTree(members), Semester, config)
+
+    # Nothing is left running for the main output, which is never read
+    assert len(processes) == 3
+    assert all(process.poll() is not None for process in processes)
+    assert set(threading.enumerate()) <= threads